@@ -0,0 +1,224 @@
+"""Headless HTTP/JSON API over the generation engine and research history.
+
+Runs on the standard library's ThreadingHTTPServer, one thread per request,
+and uses the same engine cache and rate limiter as the Streamlit UI when both
+run in one process (set API_PORT for the app to start it), and the same
+database and login sessions either way.
+
+Endpoints (all but /login and /healthz need "Authorization: Bearer <session token>"):
+    GET  /healthz            200 once the process is warmed up, 503 before (see warmup.py)
+    POST /login              {"username", "password"} -> {"token", "user"}
+    GET  /trending           [?refresh=1]
+    POST /generate           {"topic", "content_types": [...], "refresh": false, "save": true}
+    GET  /history            [?limit=20&before=<created_at>,<id>&include_archive=1]
+    GET  /history/<id>       [?archive_month=YYYY-MM]
+
+Usage:
+    python api_server.py --host 127.0.0.1 --port 8600
+"""
+import argparse
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import engine
+import quotas
+import scheduling
+import warmup
+from database import DatabaseManager
+from sessions import create_session, resolve_session
+from throttle import LoginThrottle, client_address, client_key, user_key
+
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "0") or 0)
+MAX_BODY_BYTES = 64 * 1024
+MAX_HISTORY_PAGE = 100
+HISTORY_ITEM = re.compile(r"^/history/(\d+)$")
+# archive_month names an archive file to attach, so nothing but YYYY-MM gets through
+ARCHIVE_MONTH = re.compile(r"\d{4}-\d{2}", re.ASCII)
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "ScholarMindAPI/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if method == "GET" and url.path == "/healthz":
+                status = warmup.status()
+                self._send(200 if status["ready"] else 503, status)
+            elif method == "POST" and url.path == "/login":
+                self._send(200, self.login())
+            elif method == "GET" and url.path == "/trending":
+                user = self._authenticate()
+                self._send(200, {"topics": engine.get_trending_topics(use_cache=self.query.get("refresh") != "1",
+                                                                      user=user['id'],
+                                                                      weight=scheduling.role_weight(user['role']))})
+            elif method == "POST" and url.path == "/generate":
+                self._send(200, self.generate(self._authenticate()))
+            elif method == "GET" and url.path == "/history":
+                self._send(200, self.history(self._authenticate()))
+            elif method == "GET" and HISTORY_ITEM.match(url.path):
+                history_id = int(HISTORY_ITEM.match(url.path).group(1))
+                self._send(200, self.history_item(self._authenticate(), history_id))
+            else:
+                raise ApiError(404, "Not found")
+        except ApiError as e:
+            self._send(e.status, {"error": str(e)})
+        except (engine.RateLimitExceeded, quotas.QuotaExceeded) as e:
+            self._send(429, {"error": str(e)})
+        except TimeoutError:
+            self._send(503, {"error": "The server is busy, please try again in a moment"})
+        except Exception as e:  # keep the server up and tell the client
+            self.log_error("Unhandled error on %s %s: %r", method, self.path, e)
+            self._send(500, {"error": "Internal server error"})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise ApiError(413, "Request body too large")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise ApiError(400, "Request body must be JSON")
+        if not isinstance(body, dict):
+            raise ApiError(400, "Request body must be a JSON object")
+        return body
+
+    def _authenticate(self):
+        header = self.headers.get("Authorization", "")
+        token = header[7:].strip() if header.startswith("Bearer ") else ""
+        user = resolve_session(self.server.db.db_name, token) if token else None
+        if user is None:
+            raise ApiError(401, "Missing, invalid or expired session token")
+        return user
+
+    def login(self):
+        body = self._body()
+        username, password = str(body.get("username") or ""), str(body.get("password") or "")
+        if not username or not password:
+            raise ApiError(400, "username and password are required")
+        client = client_address(self.client_address[0], self.headers.get("X-Forwarded-For"))
+        keys = [user_key(username), client_key(client)]
+        wait = self.server.throttle.retry_after(keys)
+        if wait:
+            raise ApiError(429, f"Too many failed attempts, try again in {wait} seconds")
+        user = self.server.db.authenticate_user(username, password)
+        if not user:
+            self.server.throttle.record_failure(keys)
+            raise ApiError(401, "Invalid credentials")
+        self.server.throttle.record_success(keys[:1])
+        return {"token": create_session(self.server.db.db_name, user['id']), "user": user}
+
+    def generate(self, user):
+        body = self._body()
+        topic = str(body.get("topic") or "").strip()
+        if not topic:
+            raise ApiError(400, "topic is required")
+        content_types = body.get("content_types") or [body.get("content_type") or "abstract"]
+        if not isinstance(content_types, list) or not all(isinstance(t, str) for t in content_types):
+            raise ApiError(400, "content_types must be a list of strings")
+        unknown = [t for t in content_types if t not in engine.CONTENT_TYPES]
+        if unknown:
+            raise ApiError(400, f"Unknown content types: {', '.join(map(str, unknown))}")
+        results = {}
+        for content_type in content_types:
+            generation = engine.generate_research_content(topic, content_type, use_cache=not body.get("refresh"),
+                                                          user=user['id'], weight=scheduling.role_weight(user['role']))
+            history_id = None
+            if generation.raw is not None and body.get("save", True):
+                history_id = self.server.db.save_generation(user['id'], topic, content_type, generation.raw,
+                                                            generation.version, generation.fresh)
+            results[content_type] = {"content": generation.content, "cached": not generation.fresh,
+                                     "history_id": history_id}
+        return {"topic": topic, "results": results}
+
+    def history(self, user):
+        try:
+            limit = min(int(self.query.get("limit", 20)), MAX_HISTORY_PAGE)
+            before = self.query.get("before")
+            before = tuple(before.rsplit(",", 1)) if before else None
+            if before:
+                before = (before[0], int(before[1]))
+        except (ValueError, IndexError):
+            raise ApiError(400, "limit must be a number and before must be <created_at>,<id>")
+        rows = self.server.db.get_research_history(user['id'], limit=limit, before=before,
+                                                   include_archive=self.query.get("include_archive") == "1")
+        return {"items": [{"id": row[0], "topic": row[1], "content_type": row[2], "created_at": row[3],
+                           "archive_month": row[4] if len(row) > 4 else None} for row in rows]}
+
+    def history_item(self, user, history_id):
+        archive_month = self.query.get("archive_month")
+        if archive_month is not None and not ARCHIVE_MONTH.fullmatch(archive_month):
+            raise ApiError(400, "archive_month must look like YYYY-MM")
+        content = self.server.db.get_research_content(history_id, archive_month, user_id=user['id'])
+        if content is None:
+            raise ApiError(404, "History item not found")
+        return {"id": history_id, "archive_month": archive_month, "content": content}
+
+
+def make_server(host=API_HOST, port=API_PORT, db_name="scholarmind.db"):
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    server.db = DatabaseManager(db_name)
+    server.throttle = LoginThrottle(db_name)
+    # Inside the Streamlit process the app's tracker is already set and shared
+    if engine.quota_tracker is None:
+        engine.quota_tracker = quotas.QuotaTracker(db_name)
+    return server
+
+
+def start_api_server(host=API_HOST, port=API_PORT, db_name="scholarmind.db"):
+    """Serve the API from a daemon thread, e.g. inside the Streamlit process to share its engine cache"""
+    server = make_server(host, port, db_name)
+    thread = threading.Thread(target=server.serve_forever, name="api-server", daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ScholarMind HTTP/JSON API")
+    parser.add_argument("--db", default="scholarmind.db")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT or 8600)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.db)
+    # Answer /healthz with 503 right away, and 200 once warm
+    warmup.start_warm_up(args.db)
+    print(f"Serving the ScholarMind API on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,40 @@
 import streamlit as st
-import pandas as pd
-import streamlit.components.v1 as components
-import google.generativeai as genai
 from dotenv import load_dotenv
 import os
 import time
 import sqlite3
-from passlib.hash import pbkdf2_sha256
-import uuid
+import engine
+import parsing
+import prompts
+import quotas
+import scheduling
+import warmup
+from assets import bundle, injector_html
+from exports import build_history_export
+from passwords import hash_password, verify_password
+from provisioning import parse_user_file, provision_users
+from sessions import (create_session, list_sessions, resolve_session, revoke_session, revoke_user_sessions,
+                      save_session_state, session_active)
+from snapshot import (SNAPSHOT_MAX_AGE_SECONDS, connect_snapshot, invalidate_snapshot, refresh_snapshot,
+                      refresh_status, snapshot_age, start_snapshot_refresher)
+from throttle import LoginThrottle, client_address, client_key, user_key
+from database import (archive_dir_for, content_hash, count_users, fetch_archived_history, fetch_history_page,
+                      list_users, read_archived_content, read_research_content, search_research, store_research_once,
+                      usage_rollups)
 
 # Load environment variables
 load_dotenv()
 
 
-# Database setup
-def init_db():
+# Database setup: the warmup creates the schema, this adds the first admin
+def create_default_admin():
     conn = sqlite3.connect('scholarmind.db')
     c = conn.cursor()
 
-    # Create users table
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  username TEXT UNIQUE NOT NULL,
-                  password_hash TEXT NOT NULL,
-                  role TEXT NOT NULL,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-
-    # Create research_history table
-    c.execute('''CREATE TABLE IF NOT EXISTS research_history
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER NOT NULL,
-                  topic TEXT NOT NULL,
-                  content_type TEXT NOT NULL,
-                  content TEXT NOT NULL,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  FOREIGN KEY(user_id) REFERENCES users(id))''')
-
     # Create admin user if none exists
     c.execute("SELECT COUNT(*) FROM users WHERE role='admin'")
     if c.fetchone()[0] == 0:
-        admin_hash = pbkdf2_sha256.hash("admin123")
+        admin_hash = hash_password("admin123")
         c.execute("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
                   ("admin", admin_hash, "admin"))
 
@@ -47,32 +42,40 @@ def init_db():
     conn.close()
 
 
-init_db()
-
-
 # Database functions
 def authenticate_user(username, password):
+    # Hashing runs in the password pool and may raise TimeoutError when it is saturated
     conn = sqlite3.connect('scholarmind.db')
     c = conn.cursor()
     c.execute("SELECT id, username, password_hash, role FROM users WHERE username = ?", (username,))
     user = c.fetchone()
     conn.close()
 
-    if user and pbkdf2_sha256.verify(password, user[2]):
-        return {
-            'id': user[0],
-            'username': user[1],
-            'role': user[3],
-            'is_admin': user[3] == 'admin'
-        }
-    return None
+    if not user:
+        return None
+    valid, new_hash = verify_password(password, user[2])
+    if not valid:
+        return None
+    if new_hash:
+        # Re-hash with the currently configured parameters
+        conn = sqlite3.connect('scholarmind.db')
+        conn.execute("UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?",
+                     (new_hash, user[0], user[2]))
+        conn.commit()
+        conn.close()
+    return {
+        'id': user[0],
+        'username': user[1],
+        'role': user[3],
+        'is_admin': user[3] == 'admin'
+    }
 
 
 def add_user(username, password, role="user"):
+    password_hash = hash_password(password)
+    conn = sqlite3.connect('scholarmind.db')
     try:
-        conn = sqlite3.connect('scholarmind.db')
         c = conn.cursor()
-        password_hash = pbkdf2_sha256.hash(password)
         c.execute("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
                   (username, password_hash, role))
         conn.commit()
@@ -83,99 +86,185 @@ def add_user(username, password, role="user"):
         conn.close()
 
 
-def save_research_history(user_id, topic, content_type, content):
+def save_research_history(user_id, topic, content_type, content, prompt_version, fresh):
+    # True when this added a row, False when a cached section was already in the user's history
     conn = sqlite3.connect('scholarmind.db')
     c = conn.cursor()
-    c.execute("INSERT INTO research_history (user_id, topic, content_type, content) VALUES (?, ?, ?, ?)",
-              (user_id, topic, content_type, content))
+    _, added = store_research_once(c, user_id, topic, content_type, content, prompt_version, fresh)
     conn.commit()
     conn.close()
+    return added
 
 
-def get_research_history(user_id):
+HISTORY_PAGE_SIZE = 20
+ARCHIVE_DIR = archive_dir_for('scholarmind.db')
+
+
+def get_research_history(user_id, before=None, limit=HISTORY_PAGE_SIZE):
+    # Metadata only, newest first; `before` is the (created_at, id) of the last row already shown.
+    # Once the hot table runs out, the page continues into the monthly archives.
     conn = sqlite3.connect('scholarmind.db')
     c = conn.cursor()
-    c.execute("""
-        SELECT id, topic, content_type, created_at 
-        FROM research_history 
-        WHERE user_id = ?
-        ORDER BY created_at DESC
-        LIMIT 50
-    """, (user_id,))
-    history = c.fetchall()
+    history = fetch_history_page(c, user_id, before, limit)
+    if len(history) < limit:
+        cursor = (history[-1][3], history[-1][0]) if history else before
+        history += fetch_archived_history(c, ARCHIVE_DIR, user_id, cursor, limit - len(history))
     conn.close()
     return history
 
 
-def get_research_content(history_id):
+def get_research_content(history_id, archive_month=None):
     conn = sqlite3.connect('scholarmind.db')
     c = conn.cursor()
-    c.execute("SELECT content FROM research_history WHERE id = ?", (history_id,))
-    content = c.fetchone()
+    if archive_month:
+        content = read_archived_content(c, ARCHIVE_DIR, archive_month, history_id)
+    else:
+        content = read_research_content(c, history_id)
     conn.close()
-    return content[0] if content else None
-
-
-# Configure Gemini API
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-
-# Set page config with attractive settings
-st.set_page_config(
-    page_title="ScholarMind Pro",
-    page_icon="🧠",
-    layout="wide",
-    initial_sidebar_state="expanded",
-    menu_items={
-        'Get Help': 'https://example.com/help',
-        'Report a bug': 'https://example.com/bug',
-        'About': "# ScholarMind Pro - AI Research Assistant"
-    }
-)
+    return content
 
 
-# Custom CSS
-def local_css(file_name):
-    try:
-        with open(file_name) as f:
-            st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
-    except FileNotFoundError:
+def search_research_history(user_id, query, content_type=None, date_from=None, date_to=None, offset=0,
+                            limit=HISTORY_PAGE_SIZE, include_archive=False):
+    conn = sqlite3.connect('scholarmind.db')
+    c = conn.cursor()
+    results = search_research(c, user_id, query, content_type, date_from, date_to, limit, offset,
+                              ARCHIVE_DIR if include_archive else None)
+    # Searching first applies index removals queued by the history triggers
+    conn.commit()
+    conn.close()
+    return results
+
+
+USER_PAGE_SIZE = 25
+
+
+@st.cache_resource(show_spinner=False)
+def login_throttle():
+    # One throttle per server process so every session sees the same counters
+    return LoginThrottle('scholarmind.db')
+
+
+def login_client():
+    # The peer address of this browser connection, or the client behind TRUSTED_PROXY_HOPS proxies
+    from streamlit import runtime
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    session_client = runtime.get_instance().get_client(ctx.session_id) if ctx and runtime.exists() else None
+    request = getattr(session_client, "request", None)
+    if not isinstance(getattr(request, "remote_ip", None), str):  # not a browser connection, e.g. under AppTest
+        return "local"
+    return client_address(request.remote_ip, request.headers.get("X-Forwarded-For"))
+
+
+@st.cache_resource(show_spinner=False)
+def usage_quotas():
+    # One tracker per server process; the engine checks it before every model call
+    tracker = quotas.QuotaTracker('scholarmind.db')
+    engine.quota_tracker = tracker
+    return tracker
+
+
+@st.cache_resource(show_spinner=False)
+def server_warmup():
+    # Once per server process. Only what the first session needs runs inline; the hashing
+    # workers, Gemini client, CSS/JS bundle and cache priming continue in a background thread
+    return warmup.start_warm_up('scholarmind.db', steps=[("admin bootstrap", create_default_admin),
+                                                         ("login throttle", login_throttle),
+                                                         ("usage quotas", usage_quotas)], inline=True)
+
+
+# Streamlit runs its script health check as this user
+HEALTH_CHECK_EMAIL = "test@test.com"
+
+
+def check_readiness():
+    # Streamlit only runs this script for a session, so enable server.scriptHealthCheckEnabled and
+    # point the load balancer at /_stcore/script-health-check. It fails while the background
+    # warmup is running; real sessions are served meanwhile.
+    if not warmup.is_ready() and st.experimental_user.email == HEALTH_CHECK_EMAIL:
+        raise RuntimeError("Server is still warming up")
+
+
+@st.cache_resource(show_spinner=False)
+def embedded_api_server():
+    # Serving the API from this process lets its clients share the UI's generation cache and rate limit
+    from api_server import start_api_server
+
+    return start_api_server(port=int(os.getenv("API_PORT")))
+
+
+# Admin listings, analytics and exports read from a periodically refreshed snapshot
+@st.cache_resource
+def snapshot_refresher():
+    return start_snapshot_refresher('scholarmind.db')
+
+
+def get_users_page(prefix="", role=None, after=None):
+    conn = connect_snapshot('scholarmind.db')
+    c = conn.cursor()
+    users = list_users(c, prefix, role, after, USER_PAGE_SIZE)
+    conn.close()
+    return users
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_user_count(prefix="", role=None):
+    conn = connect_snapshot('scholarmind.db')
+    c = conn.cursor()
+    total = count_users(c, prefix, role)
+    conn.close()
+    return total
+
+
+def get_usage_rollups(days=30):
+    conn = connect_snapshot('scholarmind.db')
+    c = conn.cursor()
+    rollups = usage_rollups(c, days)
+    conn.close()
+    return rollups
+
+
+# Custom CSS and the mobile menu script, built once per process by assets.py and added to
+# the page head on the first run of each session; later reruns send nothing
+def inject_assets():
+    assets = bundle()
+    if st.session_state.get('assets_injected') == assets['fingerprint']:
+        return
+    if not assets['stylesheet_found']:
         st.warning("styles.css file not found. Using default styling.")
+    import streamlit.components.v1 as components
 
+    components.html(injector_html(), height=0)
+    st.session_state.assets_injected = assets['fingerprint']
 
-local_css("styles.css")
 
+# Generation goes through engine.py, whose cache, scheduler and rate limiter are shared with the HTTP API
+def scheduler_identity():
+    # Who the scheduler queues a call for, and with what weight
+    if not st.session_state.authenticated:
+        return {"user": None, "weight": 1.0}
+    return {"user": st.session_state.user_id,
+            "weight": scheduling.role_weight("admin" if st.session_state.is_admin else "user")}
 
-# Initialize session state
-def get_trending_topics():
-    prompt = """Generate exactly 5 trending academic research topics with brief descriptions.
-    Format as:
-    1. Topic: Description (max 20 words)
-    2. Topic: Description (max 20 words)
-    3. Topic: Description (max 20 words)
-    4. Topic: Description (max 20 words)
-    5. Topic: Description (max 20 words)
-    Return only the numbered list, nothing else."""
-    for attempt in range(3):  # Retry up to 3 times
-        try:
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            response = model.generate_content(prompt)
-            topics = [line.split(": ", 1)[1].strip() for line in response.text.split("\n")
-                      if ": " in line and line.strip()]
-            if len(topics) >= 5:
-                return topics[:5]  # Ensure exactly 5 topics
-            time.sleep(1)
-        except Exception as e:
-            st.error(f"Attempt {attempt + 1} failed: {str(e)}")
-            time.sleep(1)
-    return [
-        "AI Ethics: Ethical implications of AI in decision-making",
-        "Quantum Computing: Advances in quantum algorithms",
-        "Climate Modeling: Improved climate change predictions",
-        "Bioinformatics: Genomic data analysis techniques",
-        "Renewable Energy: Next-generation solar cell technology"
-    ]
+
+def get_trending_topics(refresh=False):
+    try:
+        return engine.get_trending_topics(
+            use_cache=not refresh,
+            on_error=lambda attempt, e: st.error(f"Attempt {attempt} failed: {str(e)}"),
+            **scheduler_identity()
+        )
+    except engine.RateLimitExceeded:
+        st.error("Too many generation requests right now, please try again in a moment")
+        return list(engine.FALLBACK_TOPICS)
+    except quotas.QuotaExceeded as e:
+        st.error(str(e))
+        return list(engine.FALLBACK_TOPICS)
 
 
+# Initialize session state
 def init_session_state():
     defaults = {
         'authenticated': False,
@@ -190,7 +279,18 @@ def init_session_state():
         'show_subtopic_section': False,
         'show_signup': False,
         'username': None,
-        'user_id': None
+        'user_id': None,
+        'saved_history': None,
+        'saved_history_done': False,
+        'saved_sections': set(),
+        'open_history_id': None,
+        'search_offset': 0,
+        'search_key': None,
+        'user_list_key': None,
+        'user_page_cursors': [],
+        'session_token': None,
+        'session_saved_state': None,
+        'session_checked_at': 0.0
     }
 
     for key, value in defaults.items():
@@ -198,75 +298,122 @@ def init_session_state():
             st.session_state[key] = value
 
 
-init_session_state()
+# Research flow state saved with the login session and restored after a browser reload
+SESSION_STATE_KEYS = ["current_page", "final_topic", "topic_stage", "trending_topics", "subtopics",
+                      "subtopic_round", "show_subtopic_section"]
+# How often a live session re-checks that its token has not been revoked
+SESSION_CHECK_SECONDS = 30
 
-# Gemini model with error handling
-try:
-    model = genai.GenerativeModel('gemini-1.5-flash')
-except Exception as e:
-    st.error(f"Failed to initialize Gemini model: {str(e)}")
-    st.stop()
+
+def navigation_pages(is_admin):
+    return ["Home", "Research Assistant", "Saved Projects", "Settings"] + (["Admin Panel"] if is_admin else [])
+
+
+def start_session(user, token):
+    st.session_state.update({
+        'authenticated': True,
+        'is_admin': user['is_admin'],
+        'username': user['username'],
+        'user_id': user['id'],
+        'current_page': "home",
+        'session_token': token,
+        'session_checked_at': time.time()
+    })
+    st.query_params["sid"] = token
+
+
+def end_session():
+    if "sid" in st.query_params:
+        del st.query_params["sid"]
+    st.session_state.authenticated = False
+    st.session_state.session_token = None
+    st.session_state.session_saved_state = None
+    st.session_state.trending_topics = []
+    st.session_state.subtopics = []
+    st.session_state.subtopic_round = 1
+    st.session_state.show_subtopic_section = False
+    st.session_state.final_topic = None
+    st.session_state.topic_stage = "selecting"
+    st.session_state.selected_trending = None
+    st.session_state.saved_history = None
+    st.session_state.saved_sections = set()
+    st.session_state.open_history_id = None
+
+
+def restore_session():
+    # A reload starts with empty session_state; the signed ?sid= token brings the login back
+    # without another password verify
+    token = st.query_params.get("sid")
+    if st.session_state.authenticated or not token:
+        return
+    session = resolve_session('scholarmind.db', token)
+    if session is None:
+        del st.query_params["sid"]
+        return
+    start_session(session, token)
+    state = {key: value for key, value in session['state'].items() if key in SESSION_STATE_KEYS}
+    st.session_state.update(state)
+    st.session_state.session_saved_state = state
+    if state.get('current_page') in navigation_pages(session['is_admin']):
+        st.session_state.navigation = state['current_page']
+
+
+def check_session():
+    # Pick up revocations from the admin panel within SESSION_CHECK_SECONDS
+    if time.time() - st.session_state.session_checked_at < SESSION_CHECK_SECONDS:
+        return True
+    st.session_state.session_checked_at = time.time()
+    if st.session_state.session_token and session_active('scholarmind.db', st.session_state.session_token):
+        return True
+    end_session()
+    return False
+
+
+def persist_session_state():
+    state = {key: st.session_state[key] for key in SESSION_STATE_KEYS}
+    if state != st.session_state.session_saved_state:
+        save_session_state('scholarmind.db', st.session_state.session_token, state)
+        st.session_state.session_saved_state = state
 
 
 # Content generation functions
-def generate_research_content(topic, content_type):
-    prompts = {
-        "questions": f"""Suggest 3 research questions on: '{topic}'
-        Format as markdown bullet points""",
-        "literature": f"""Write a detailed literature review (400-500 words) on: "{topic}".
-        Include 5 relevant papers with summaries, overall findings, and research gaps.
-        Use markdown formatting with headings and bullet points.""",
-        "future": f"""List 5 future research directions for: '{topic}' 
-        Format as markdown bullet points""",
-        "references": f"""Provide 5 APA-style references for papers related to: '{topic}'
-        Format as numbered list""",
-        "abstract": f"""Write a formal academic abstract (150-200 words) for: '{topic}'
-        Use professional academic language""",
-        "analysis": f"""Generate exactly 5 sub-topics related to: '{topic}'.
-        Format as:
-        1. Sub-topic description
-        2. Sub-topic description
-        3. Sub-topic description
-        4. Sub-topic description
-        5. Sub-topic description
-        Return only the numbered list, nothing else."""
-    }
-    for attempt in range(3):  # Retry up to 3 times
-        try:
-            response = model.generate_content(prompts[content_type])
-            content = response.text
-            if content_type == "analysis":
-                subtopics = [line.split(". ", 1)[1].strip() for line in content.split("\n")
-                             if line.strip() and line.strip()[0].isdigit() and ". " in line]
-                if len(subtopics) >= 5:
-                    if st.session_state.authenticated:
-                        save_research_history(
-                            st.session_state.user_id,
-                            topic,
-                            content_type,
-                            content
-                        )
-                    return "\n".join([f"{i + 1}. {subtopics[i]}" for i in range(5)])
-            if st.session_state.authenticated:
-                save_research_history(
-                    st.session_state.user_id,
-                    topic,
-                    content_type,
-                    content
-                )
-            return content
-        except Exception as e:
-            st.error(f"Attempt {attempt + 1} failed for {content_type}: {str(e)}")
-            time.sleep(1)
-    if content_type == "analysis":
-        return "\n".join([
-            "1. Sample sub-topic 1",
-            "2. Sample sub-topic 2",
-            "3. Sample sub-topic 3",
-            "4. Sample sub-topic 4",
-            "5. Sample sub-topic 5"
-        ])
-    return f"Could not generate {content_type} content. Please try again."
+CONTENT_TYPES = engine.CONTENT_TYPES
+
+
+def generate_research_content(topic, content_type, refresh=False, priority=scheduling.INTERACTIVE):
+    try:
+        generation = engine.generate_research_content(
+            topic,
+            content_type,
+            use_cache=not refresh,
+            on_error=lambda attempt, e: st.error(f"Attempt {attempt} failed for {content_type}: {str(e)}"),
+            priority=priority,
+            **scheduler_identity()
+        )
+    except (engine.RateLimitExceeded, quotas.QuotaExceeded) as e:
+        if isinstance(e, quotas.QuotaExceeded):
+            st.error(str(e))
+        else:
+            st.error("Too many generation requests right now, please try again in a moment")
+        if content_type == "analysis":
+            return engine.FALLBACK_SUBTOPICS
+        return f"Could not generate {content_type} content. Please try again."
+    # New output is always saved; a section from the cache once per user, and plain reruns
+    # that get it again don't go back to the database
+    if generation.raw is not None and st.session_state.authenticated:
+        digest = content_hash(generation.raw)
+        if generation.fresh or digest not in st.session_state.saved_sections:
+            if save_research_history(
+                st.session_state.user_id,
+                topic,
+                content_type,
+                generation.raw,
+                generation.version,
+                generation.fresh
+            ):
+                st.session_state.saved_history = None
+            st.session_state.saved_sections.add(digest)
+    return generation.content
 
 
 # Authentication components
@@ -290,18 +437,29 @@ def show_login():
             password = st.text_input("Password", type="password", key="login_password")
 
             if st.button("Login", key="login_button", type="primary"):
-                user = authenticate_user(username, password)
+                # Locked-out usernames and clients are turned away before any password hashing
+                throttle = login_throttle()
+                keys = [user_key(username), client_key(login_client())]
+                wait = throttle.retry_after(keys)
+                if wait:
+                    st.error(f"Too many failed attempts, please try again in {wait} seconds")
+                    return
+                try:
+                    user = authenticate_user(username, password)
+                except TimeoutError:
+                    st.error("The server is busy, please try again in a moment")
+                    return
                 if user:
-                    st.session_state.update({
-                        'authenticated': True,
-                        'is_admin': user['is_admin'],
-                        'username': user['username'],
-                        'user_id': user['id'],
-                        'current_page': "home"
-                    })
+                    # Only the username's counter: a valid account must not reset a client's failures
+                    throttle.record_success(keys[:1])
+                    start_session(user, create_session('scholarmind.db', user['id']))
                     st.rerun()
                 else:
-                    st.error("Invalid credentials")
+                    lockout = throttle.record_failure(keys)
+                    if lockout:
+                        st.error(f"Too many failed attempts, please try again in {lockout} seconds")
+                    else:
+                        st.error("Invalid credentials")
 
     with col2:
         with st.container():
@@ -328,7 +486,12 @@ def show_signup():
             if st.button("Create Account", key="signup_button"):
                 if new_user and new_pass:
                     if new_pass == confirm_pass:
-                        if add_user(new_user, new_pass):
+                        try:
+                            created = add_user(new_user, new_pass)
+                        except TimeoutError:
+                            st.error("The server is busy, please try again in a moment")
+                            return
+                        if created:
                             st.success("Account created! Please login.")
                             st.session_state.show_signup = False
                             st.rerun()
@@ -409,7 +572,7 @@ def research_dashboard():
             )
             if st.button("🔄 Refresh Topics", key="refresh_topics"):
                 with st.spinner("Refreshing trending topics..."):
-                    st.session_state.trending_topics = get_trending_topics()
+                    st.session_state.trending_topics = get_trending_topics(refresh=True)
                     st.session_state.selected_trending = None
                 st.rerun()
 
@@ -461,10 +624,7 @@ def handle_subtopic_generation():
         if st.button("Generate Subtopics Now", key="generate_subtopics_now"):
             with st.spinner("Generating subtopics..."):
                 content = generate_research_content(st.session_state.final_topic, "analysis")
-                subtopics = [line.split(". ", 1)[1].strip() for line in content.split("\n")
-                             if line.strip() and line.strip()[0].isdigit() and ". " in line][:5]
-                st.session_state.subtopics = subtopics if subtopics else ["Sample sub-topic " + str(i + 1) for i in
-                                                                          range(5)]
+                st.session_state.subtopics = parsing.unnumbered(content)
             st.rerun()
 
     # Display subtopics if they exist
@@ -483,12 +643,8 @@ def handle_subtopic_generation():
             cols = st.columns(3)
             if cols[0].button("🔄 More Subtopics", key="more_subtopics"):
                 with st.spinner("Generating more subtopics..."):
-                    content = generate_research_content(st.session_state.final_topic, "analysis")
-                    new_subtopics = [line.split(". ", 1)[1].strip() for line in content.split("\n")
-                                     if line.strip() and line.strip()[0].isdigit() and ". " in line][:5]
-                    new_subtopics = new_subtopics if new_subtopics else ["Sample sub-topic " + str(i + 1) for i in
-                                                                         range(5)]
-                    st.session_state.subtopics.extend(new_subtopics)
+                    content = generate_research_content(st.session_state.final_topic, "analysis", refresh=True)
+                    st.session_state.subtopics.extend(parsing.unnumbered(content))
                     st.session_state.subtopic_round += 1
                 st.rerun()
 
@@ -507,34 +663,6 @@ def show_research_output():
     st.divider()
     st.header(f"🧠 Research Output: {st.session_state.final_topic}")
 
-    # Add custom CSS for white tab text
-    st.markdown("""
-    <style>
-        /* Make all tab text white */
-        .stTabs [role="tab"] {
-            color: white !important;
-        }
-
-        /* Active tab styling */
-        .stTabs [aria-selected="true"] {
-            background-color: #3498db;
-            font-weight: bold;
-        }
-
-        /* Inactive tab styling */
-        .stTabs [role="tab"]:not([aria-selected="true"]) {
-            background-color: #2c3e50;
-            opacity: 0.8;
-        }
-
-        /* Hover effect */
-        .stTabs [role="tab"]:hover {
-            opacity: 1;
-            border-color: white;
-        }
-    </style>
-    """, unsafe_allow_html=True)
-
     tabs = st.tabs([
         "📝 Research Questions",
         "📚 Literature Review",
@@ -544,6 +672,7 @@ def show_research_output():
         "📜 Full Analysis"
     ])
 
+    # Only the first tab is visible at first; the others are generated at prefetch priority
     with tabs[0]:
         show_research_questions()
     with tabs[1]:
@@ -567,35 +696,35 @@ def show_research_questions():
 
 def show_literature_review():
     st.subheader("Literature Review")
-    content = generate_research_content(st.session_state.final_topic, "literature")
+    content = generate_research_content(st.session_state.final_topic, "literature", priority=scheduling.PREFETCH)
     st.markdown(content)
     add_download_button(content, "literature_review.md")
 
 
 def show_future_directions():
     st.subheader("Future Research Directions")
-    content = generate_research_content(st.session_state.final_topic, "future")
+    content = generate_research_content(st.session_state.final_topic, "future", priority=scheduling.PREFETCH)
     st.markdown(content)
     add_download_button(content, "future_directions.md")
 
 
 def show_references():
     st.subheader("APA References")
-    content = generate_research_content(st.session_state.final_topic, "references")
+    content = generate_research_content(st.session_state.final_topic, "references", priority=scheduling.PREFETCH)
     st.markdown(content)
     add_download_button(content, "references.md")
 
 
 def show_abstract():
     st.subheader("Academic Abstract")
-    content = generate_research_content(st.session_state.final_topic, "abstract")
+    content = generate_research_content(st.session_state.final_topic, "abstract", priority=scheduling.PREFETCH)
     st.markdown(content)
     add_download_button(content, "abstract.md")
 
 
 def show_full_analysis():
     st.subheader("Comprehensive Analysis")
-    content = generate_research_content(st.session_state.final_topic, "analysis")
+    content = generate_research_content(st.session_state.final_topic, "analysis", priority=scheduling.PREFETCH)
     st.markdown(content)
     add_download_button(content, "full_analysis.md")
 
@@ -618,14 +747,61 @@ def saved_projects():
         st.warning("Please login to view saved projects")
         return
 
-    history = get_research_history(st.session_state.user_id)
-    if not history:
-        st.info("You don't have any saved research yet")
-        return
+    show_export_section()
 
-    for item in history:
-        with st.expander(f"{item[1]} - {item[2]} ({item[3].split()[0]})"):
-            content = get_research_content(item[0])
+    query = st.text_input("🔎 Search your research", key="history_search")
+    if query.strip():
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            content_type = st.selectbox("Content type", ["All"] + CONTENT_TYPES, key="history_search_type")
+        with col2:
+            date_from = st.date_input("From", value=None, key="history_search_from")
+        with col3:
+            date_to = st.date_input("To", value=None, key="history_search_to")
+        include_archive = st.checkbox("Include archive", key="history_search_archive")
+        show_search_results(query, None if content_type == "All" else content_type, date_from, date_to,
+                            include_archive)
+    else:
+        show_history_pages()
+
+
+def show_export_section():
+    with st.expander("📦 Export all"):
+        col1, col2 = st.columns(2)
+        with col1:
+            content_type = st.selectbox("Content type", ["All"] + CONTENT_TYPES, key="export_type")
+        with col2:
+            include_archive = st.checkbox("Include archive", key="export_archive")
+
+        # The ZIP is built on request and then reused from disk until the history changes.
+        # The download button only exists on the run that prepared it, so other reruns don't read the file.
+        if st.button("Prepare export", key="prepare_export"):
+            with st.spinner("Building export..."):
+                path = build_history_export(
+                    'scholarmind.db',
+                    st.session_state.user_id,
+                    None if content_type == "All" else content_type,
+                    include_archive
+                )
+            with open(path, "rb") as f:
+                st.download_button(
+                    label="📥 Download ZIP",
+                    data=f,
+                    file_name="scholarmind_research.zip",
+                    mime="application/zip",
+                    key="download_export"
+                )
+
+
+def show_history_entry(item, snippet=None, archive_month=None):
+    is_open = st.session_state.open_history_id == item[0]
+    label = f"{item[1]} - {item[2]} ({item[3].split()[0]})" + (" 🗄️" if archive_month else "")
+    with st.expander(label, expanded=is_open):
+        if snippet and not is_open:
+            st.markdown(snippet)
+        # Only the entry the user opened pulls its full content
+        if is_open:
+            content = get_research_content(item[0], archive_month)
             st.markdown(content)
             st.download_button(
                 label="📥 Download",
@@ -634,13 +810,79 @@ def saved_projects():
                 mime="text/markdown",
                 key=f"download_{item[0]}"
             )
+        elif st.button("📖 Open", key=f"open_{item[0]}"):
+            st.session_state.open_history_id = item[0]
+            st.rerun()
+
+
+def show_search_results(query, content_type, date_from, date_to, include_archive):
+    # Start from the first page whenever the query or filters change
+    search_key = (query, content_type, date_from, date_to, include_archive)
+    if st.session_state.search_key != search_key:
+        st.session_state.search_key = search_key
+        st.session_state.search_offset = 0
+
+    offset = st.session_state.search_offset
+    # Fetch one extra row to know whether there is a next page
+    results = search_research_history(st.session_state.user_id, query, content_type, date_from, date_to,
+                                      offset=offset, limit=HISTORY_PAGE_SIZE + 1,
+                                      include_archive=include_archive)
+    if not results:
+        st.info("No saved research matches your search")
+        return
+
+    for item in results[:HISTORY_PAGE_SIZE]:
+        show_history_entry(item, snippet=item[4], archive_month=item[5])
+
+    cols = st.columns(2)
+    if offset and cols[0].button("⬅️ Previous", key="search_prev"):
+        st.session_state.search_offset = max(0, offset - HISTORY_PAGE_SIZE)
+        st.rerun()
+    if len(results) > HISTORY_PAGE_SIZE and cols[1].button("Next ➡️", key="search_next"):
+        st.session_state.search_offset = offset + HISTORY_PAGE_SIZE
+        st.rerun()
+
+
+def show_history_pages():
+    # Pages of metadata are kept in session state and extended with "Load more"
+    if st.session_state.saved_history is None:
+        page = get_research_history(st.session_state.user_id)
+        st.session_state.saved_history = page
+        st.session_state.saved_history_done = len(page) < HISTORY_PAGE_SIZE
+
+    history = st.session_state.saved_history
+    if not history:
+        st.info("You don't have any saved research yet")
+        return
+
+    if st.button("🔄 Refresh", key="refresh_history"):
+        st.session_state.saved_history = None
+        st.session_state.open_history_id = None
+        st.rerun()
+
+    for item in history:
+        show_history_entry(item, archive_month=item[4] if len(item) > 4 else None)
+
+    if not st.session_state.saved_history_done:
+        if st.button("⬇️ Load more", key="load_more_history"):
+            last = history[-1]
+            page = get_research_history(st.session_state.user_id, before=(last[3], last[0]))
+            st.session_state.saved_history = history + page
+            st.session_state.saved_history_done = len(page) < HISTORY_PAGE_SIZE
+            st.rerun()
 
 
 # Admin Panel
 def admin_panel():
+    # pandas is only needed for the admin tables and charts, so it is not imported at startup
+    import pandas as pd
+
     st.title("👨‍💻 Admin Dashboard")
     st.markdown("---")
 
+    snapshot_refresher()
+    show_snapshot_status()
+
     tab1, tab2 = st.tabs(["User Management", "System Analytics"])
 
     with tab1:
@@ -655,34 +897,297 @@ def admin_panel():
 
                 if st.button("Add User", key="add_user"):
                     if new_user and new_pass:
-                        if add_user(new_user, new_pass, new_role):
+                        try:
+                            created = add_user(new_user, new_pass, new_role)
+                        except TimeoutError:
+                            created = None
+                            st.error("Password hashing is busy, please try again")
+                        if created:
+                            invalidate_snapshot()
+                            get_user_count.clear()
                             st.success(f"User {new_user} added successfully!")
-                        else:
+                        elif created is not None:
                             st.error("Username already exists")
                     else:
                         st.error("Please enter both username and password")
 
+            with st.expander("Bulk Import"):
+                st.caption("CSV with a username,password,role header, or a JSON list of objects with those keys")
+                upload = st.file_uploader("Users file", type=["csv", "json"], key="bulk_users_file")
+                if upload and st.button("Import Users", key="bulk_import"):
+                    try:
+                        users = parse_user_file(upload.name, upload.getvalue())
+                    except (ValueError, UnicodeDecodeError) as e:
+                        st.error(f"Could not read file: {str(e)}")
+                    else:
+                        progress = st.progress(0.0, text="Hashing passwords...")
+                        created, errors = provision_users(
+                            'scholarmind.db',
+                            users,
+                            lambda done, total: progress.progress(done / total,
+                                                                  text=f"Hashing passwords... {done}/{total}")
+                        )
+                        progress.empty()
+                        invalidate_snapshot()
+                        get_user_count.clear()
+                        st.success(f"Created {created} of {len(users)} users")
+                        if errors:
+                            st.warning(f"{len(errors)} rows were skipped")
+                            st.dataframe(pd.DataFrame(errors, columns=["Row", "Username", "Error"]),
+                                         use_container_width=True)
+
         with col2:
             with st.expander("Current Users", expanded=True):
-                conn = sqlite3.connect('scholarmind.db')
-                c = conn.cursor()
-                c.execute("SELECT id, username, role FROM users ORDER BY created_at DESC")
-                users = c.fetchall()
-                conn.close()
-
-                if users:
-                    df = pd.DataFrame(users, columns=["ID", "Username", "Role"])
-                    st.dataframe(df, use_container_width=True)
-                else:
-                    st.warning("No users found")
+                show_user_table()
+
+            with st.expander("Active Sessions"):
+                show_session_table()
+
+            with st.expander("Login Throttling"):
+                show_throttle_table()
+
+        with st.expander("Usage Quotas"):
+            show_quota_settings()
 
     with tab2:
         st.subheader("System Analytics")
-        st.write("Coming soon - system usage statistics and metrics")
+        days = st.selectbox("Period", [7, 30, 90], index=1, format_func=lambda d: f"Last {d} days",
+                            key="analytics_days")
+        daily, top_users, active_users = get_usage_rollups(days)
+
+        if not daily:
+            st.info("No research has been generated in this period")
+        else:
+            usage = pd.DataFrame(daily, columns=["Day", "Content Type", "Generations", "Characters"])
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Generations", int(usage["Generations"].sum()))
+            col2.metric("Active Users", active_users)
+            col3.metric("Characters Generated", f"{int(usage['Characters'].sum()):,}")
+
+            st.markdown("**Generations per day**")
+            st.bar_chart(usage.pivot_table(index="Day", columns="Content Type", values="Generations",
+                                           aggfunc="sum", fill_value=0))
+
+            st.markdown("**Most active users**")
+            st.dataframe(pd.DataFrame(top_users, columns=["Username", "Generations", "Characters"]),
+                         use_container_width=True)
+
+        with st.expander("Model Output Parsing"):
+            show_parse_stats()
+
+        with st.expander("Prompt Templates"):
+            show_prompt_templates()
+
+        with st.expander("Generation Queue"):
+            show_queue_metrics()
+
+        with st.expander("Server Warmup"):
+            show_warmup_status()
+
+
+def show_snapshot_status():
+    age = snapshot_age()
+    col1, col2 = st.columns([4, 1])
+    if age is None or age > SNAPSHOT_MAX_AGE_SECONDS:
+        col1.caption("📸 Reporting data: refresh pending")
+    else:
+        col1.caption(f"📸 Reporting data as of {int(age // 60)} min {int(age % 60)} s ago")
+    status = refresh_status()
+    if status["error"]:
+        col1.caption(f"⚠️ Last snapshot refresh failed: {status['error']}")
+    elif status["single_step"]:
+        col1.caption("⚠️ Writes kept restarting the last snapshot refresh, so it copied the database in one step")
+    if col2.button("Refresh data", key="refresh_snapshot"):
+        with st.spinner("Refreshing snapshot..."):
+            refresh_snapshot('scholarmind.db')
+            get_user_count.clear()
+        st.rerun()
+
+
+def show_user_table():
+    import pandas as pd
+
+    col1, col2 = st.columns([3, 2])
+    prefix = col1.text_input("Username starts with", key="user_search").strip()
+    role = col2.selectbox("Role", ["All", "user", "admin"], key="user_role_filter")
+    role = None if role == "All" else role
+
+    # Cursor stack for keyset paging; filters changing sends us back to page one
+    user_list_key = (prefix, role)
+    if st.session_state.user_list_key != user_list_key:
+        st.session_state.user_list_key = user_list_key
+        st.session_state.user_page_cursors = []
+
+    cursors = st.session_state.user_page_cursors
+    users = get_users_page(prefix, role, cursors[-1] if cursors else None)
+    total = get_user_count(prefix, role)
+
+    if not users:
+        st.warning("No users found")
+        return
+
+    df = pd.DataFrame(users, columns=["ID", "Username", "Role", "Created"])
+    st.dataframe(df, use_container_width=True, hide_index=True)
+    st.caption(f"Page {len(cursors) + 1} of {max(1, -(-total // USER_PAGE_SIZE))} · {total} users")
+
+    cols = st.columns(2)
+    if cursors and cols[0].button("⬅️ Previous", key="users_prev"):
+        cursors.pop()
+        st.rerun()
+    if len(users) == USER_PAGE_SIZE and cols[1].button("Next ➡️", key="users_next"):
+        cursors.append((users[-1][3], users[-1][0]))
+        st.rerun()
+
+
+def show_session_table():
+    import pandas as pd
+
+    # Read live from the main database so revocations show up immediately
+    sessions = list_sessions('scholarmind.db')
+    if not sessions:
+        st.info("No active sessions")
+        return
+
+    def when(ts):
+        return time.strftime("%Y-%m-%d %H:%M", time.localtime(ts))
+
+    st.dataframe(pd.DataFrame([(s[2], when(s[3]), when(s[4]), when(s[5])) for s in sessions],
+                              columns=["Username", "Started", "Last Seen", "Expires"]),
+                 use_container_width=True, hide_index=True)
+    labels = {f"{s[2]} · last seen {when(s[4])} · {s[0][:8]}": s for s in sessions}
+    choice = labels[st.selectbox("Session", list(labels), key="revoke_session_choice")]
+    col1, col2 = st.columns(2)
+    if col1.button("Revoke Session", key="revoke_session"):
+        revoke_session('scholarmind.db', session_id=choice[0])
+        st.rerun()
+    if col2.button(f"Revoke All for {choice[2]}", key="revoke_user_sessions"):
+        revoke_user_sessions('scholarmind.db', choice[1])
+        st.rerun()
+
+
+def show_throttle_table():
+    import pandas as pd
+
+    rows = login_throttle().stats()
+    if not rows:
+        st.info("No failed logins in the current window")
+        return
+    st.dataframe(pd.DataFrame(rows, columns=["Key", "Recent Failures", "Lockouts", "Locked For (s)"]),
+                 use_container_width=True, hide_index=True)
+    locked = [row[0] for row in rows if row[3] > 0]
+    if locked:
+        key = st.selectbox("Locked key", locked, key="unlock_key")
+        if st.button("Lift Lockout", key="lift_lockout"):
+            login_throttle().reset(key)
+            st.rerun()
+
+
+def show_warmup_status():
+    import pandas as pd
+
+    status = warmup.status()
+    if status["error"]:
+        st.error(f"Warmup failed, retrying on the next run: {status['error']}")
+    elif not status["ready"]:
+        st.info("Warmup is still running")
+    else:
+        st.caption(f"Warmed up in {status['finished_at'] - status['started_at']:.1f} s at "
+                   f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(status['started_at']))}")
+    st.dataframe(pd.DataFrame([(step["name"], "✅" if step["ok"] else "⚠️", step["seconds"], step["detail"] or "")
+                               for step in status["steps"]],
+                              columns=["Step", "OK", "Seconds", "Detail"]),
+                 use_container_width=True, hide_index=True)
+
+
+def show_queue_metrics():
+    import pandas as pd
+
+    metrics = engine.scheduler.stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Running Calls", f"{metrics['running']} / {metrics['max_concurrent']}")
+    col2.metric("Waiting Calls", sum(c["waiting"] for c in metrics["classes"]))
+    col3.metric("Per-User Limit", metrics["per_user_limit"])
+    st.dataframe(pd.DataFrame([(c["class"], c["waiting"], c["oldest_wait"], c["served"], c["timeouts"],
+                                c["avg_wait"], c["max_wait"]) for c in metrics["classes"]],
+                              columns=["Priority", "Waiting", "Oldest Wait (s)", "Served", "Timed Out",
+                                       "Avg Wait (s)", "Max Wait (s)"]),
+                 use_container_width=True, hide_index=True)
+    if metrics["users"]:
+        st.dataframe(pd.DataFrame([(u["user"], u["running"], u["waiting"]) for u in metrics["users"]],
+                                  columns=["User ID", "Running", "Waiting"]),
+                     use_container_width=True, hide_index=True)
+    if st.button("Refresh Queue", key="refresh_queue"):
+        st.rerun()
+
+
+def show_prompt_templates():
+    import pandas as pd
+
+    rows = [(p.name, p.version, p.output_format, p.max_output_tokens, p.cache_ttl) for p in prompts.PROMPTS.values()]
+    st.dataframe(pd.DataFrame(rows, columns=["Prompt", "Version", "Output", "Max Tokens", "Cache TTL (s)"]),
+                 use_container_width=True, hide_index=True)
+    st.caption("Cached outputs are keyed by version, so editing a prompt only invalidates its own cache")
+
+
+def show_parse_stats():
+    import pandas as pd
+
+    # Counted since this server process started
+    counts = parsing.stats()
+    if not counts:
+        st.info("No model output has been parsed yet")
+        return
+    rows = []
+    for kind, outcomes in sorted(counts.items()):
+        total = sum(outcomes.values())
+        rows.append([kind] + [outcomes[o] for o in parsing.OUTCOMES] + [f"{outcomes['failed'] / total:.1%}"])
+    st.dataframe(pd.DataFrame(rows, columns=["Output", "Strict JSON", "Repaired JSON", "List Fallback", "Failed",
+                                             "Failure Rate"]),
+                 use_container_width=True, hide_index=True)
+    st.caption("Repaired and list results were recovered locally; each failure cost a retry")
+
+
+def show_quota_settings():
+    import pandas as pd
+
+    tracker = usage_quotas()
+    st.caption("Generations and estimated tokens per user, per UTC day and month; 0 means unlimited")
+    limits = pd.DataFrame([(role, period, *tracker.limits(role)[period])
+                           for role in quotas.ROLES for period in quotas.PERIODS],
+                          columns=["Role", "Period", "Max Requests", "Max Tokens"])
+    edited = st.data_editor(limits, disabled=["Role", "Period"], hide_index=True, use_container_width=True,
+                            key="quota_editor")
+    if st.button("Save Quotas", key="save_quotas"):
+        # A cleared cell comes back as NaN, which int() can't convert
+        if edited[["Max Requests", "Max Tokens"]].isna().any(axis=None):
+            st.error("Enter a number for every quota (0 means unlimited)")
+        else:
+            for row in edited.itertuples(index=False):
+                tracker.set_limits(row[0], row[1], max(0, int(row[2])), max(0, int(row[3])))
+            st.success("Quotas saved")
+
+    period = st.radio("Usage this", quotas.PERIODS, horizontal=True, key="quota_usage_period")
+    usage = tracker.usage(period)
+    if not usage:
+        st.info(f"No generations yet this {period}")
+        return
+
+    def share(used, limit):
+        return f"{used / limit:.0%}" if limit else "-"
+
+    rows = []
+    for user_id, username, role, requests, tokens in usage:
+        max_requests, max_tokens = tracker.limits(role)[period]
+        rows.append((username, role, requests, share(requests, max_requests), tokens, share(tokens, max_tokens)))
+    st.dataframe(pd.DataFrame(rows, columns=["Username", "Role", "Requests", "Request Quota Used", "Tokens",
+                                             "Token Quota Used"]),
+                 use_container_width=True, hide_index=True)
 
 
 # Main app flow
 def main():
+    if st.session_state.authenticated and not check_session():
+        st.warning("Your session has ended, please log in again")
     if not st.session_state.authenticated:
         show_auth()
     else:
@@ -695,24 +1200,18 @@ def show_authenticated_interface():
         st.sidebar.markdown("**Admin privileges** 🔑")
 
     if st.sidebar.button("Logout"):
-        st.session_state.authenticated = False
-        st.session_state.trending_topics = []
-        st.session_state.subtopics = []
-        st.session_state.subtopic_round = 1
-        st.session_state.show_subtopic_section = False
-        st.session_state.final_topic = None
-        st.session_state.topic_stage = "selecting"
-        st.session_state.selected_trending = None
+        revoke_session('scholarmind.db', st.session_state.session_token)
+        end_session()
         st.rerun()
 
     st.session_state.current_page = st.sidebar.radio(
         "Navigation",
-        ["Home", "Research Assistant", "Saved Projects", "Settings"] +
-        (["Admin Panel"] if st.session_state.is_admin else []),
+        navigation_pages(st.session_state.is_admin),
         key="navigation"
     )
 
     route_page()
+    persist_session_state()
 
 
 def route_page():
@@ -734,98 +1233,27 @@ def route_page():
         admin_panel()
 
 
-# Add this right before if __name__ == "__main__":
-components.html("""
-<script>
-function setupHamburgerMenu() {
-    const sidebar = document.querySelector('[data-testid="stSidebar"]');
-    const hamburger = document.createElement('div');
-
-    // Create hamburger button
-    hamburger.innerHTML = `
-        <style>
-            .hamburger-btn {
-                display: none;
-                flex-direction: column;
-                justify-content: space-around;
-                width: 2rem;
-                height: 2rem;
-                background: transparent;
-                border: none;
-                cursor: pointer;
-                padding: 0;
-                z-index: 10;
-                position: fixed;
-                top: 1rem;
-                left: 1rem;
-            }
-            .hamburger-btn div {
-                width: 2rem;
-                height: 0.25rem;
-                background: #ecf0f1;
-                border-radius: 10px;
-                transition: all 0.3s linear;
-            }
-            @media (max-width: 768px) {
-                .hamburger-btn {
-                    display: flex;
-                }
-                [data-testid="stSidebar"] {
-                    transform: translateX(-100%);
-                    transition: transform 0.3s ease-in-out;
-                    position: fixed !important;
-                    height: 100vh !important;
-                    z-index: 5;
-                }
-                [data-testid="stSidebar"].open {
-                    transform: translateX(0);
-                }
-                [data-testid="collapsedControl"] {
-                    display: none !important;
-                }
-            }
-        </style>
-        <button class="hamburger-btn" aria-label="Menu">
-            <div></div>
-            <div></div>
-            <div></div>
-        </button>
-    `;
-    document.body.appendChild(hamburger);
-
-    // Toggle sidebar
-    document.querySelector('.hamburger-btn').addEventListener('click', function() {
-        sidebar.classList.toggle('open');
-    });
-
-    // Close when clicking outside on mobile
-    document.addEventListener('click', function(event) {
-        if (window.innerWidth <= 768 && 
-            !sidebar.contains(event.target) && 
-            !event.target.closest('.hamburger-btn') &&
-            sidebar.classList.contains('open')) {
-            sidebar.classList.remove('open');
-        }
-    });
-
-    // Ensure sidebar is visible on desktop
-    function handleResize() {
-        if (window.innerWidth > 768) {
-            sidebar.classList.add('open');
-        }
-    }
-
-    window.addEventListener('resize', handleResize);
-    handleResize();
-}
-
-if (document.readyState === 'complete') {
-    setupHamburgerMenu();
-} else {
-    window.addEventListener('load', setupHamburgerMenu);
-}
-</script>
-""", height=0)
-
 if __name__ == "__main__":
+    # The script's work runs here rather than at import: the password hashing workers start from
+    # a fork server and import this script as __mp_main__, where none of it may run
+    server_warmup()
+    check_readiness()
+    if os.getenv("API_PORT"):
+        embedded_api_server()
+
+    # Set page config with attractive settings
+    st.set_page_config(
+        page_title="ScholarMind Pro",
+        page_icon="🧠",
+        layout="wide",
+        initial_sidebar_state="expanded",
+        menu_items={
+            'Get Help': 'https://example.com/help',
+            'Report a bug': 'https://example.com/bug',
+            'About': "# ScholarMind Pro - AI Research Assistant"
+        }
+    )
+    inject_assets()
+    init_session_state()
+    restore_session()
     main()
\ No newline at end of file
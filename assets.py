@@ -0,0 +1,194 @@
+"""Static CSS/JS bundle for the Streamlit UI.
+
+styles.css, the research-output tab styles and the mobile hamburger menu are
+minified into one bundle, fingerprinted and cached in memory, so the work is
+done once per process (and again only when styles.css changes). `injector_html`
+wraps the bundle in a snippet that adds it to the parent page's <head> once;
+the app renders it on the first run of a session only.
+"""
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+
+STYLESHEET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "styles.css")
+
+TAB_CSS = """
+/* Research output tabs */
+.stTabs [role="tab"] {
+    color: white !important;
+}
+
+.stTabs [aria-selected="true"] {
+    background-color: #3498db;
+    font-weight: bold;
+}
+
+.stTabs [role="tab"]:not([aria-selected="true"]) {
+    background-color: #2c3e50;
+    opacity: 0.8;
+}
+
+.stTabs [role="tab"]:hover {
+    opacity: 1;
+    border-color: white;
+}
+"""
+
+HAMBURGER_CSS = """
+/* Mobile sidebar toggle */
+.hamburger-btn {
+    display: none;
+    flex-direction: column;
+    justify-content: space-around;
+    width: 2rem;
+    height: 2rem;
+    background: transparent;
+    border: none;
+    cursor: pointer;
+    padding: 0;
+    z-index: 10;
+    position: fixed;
+    top: 1rem;
+    left: 1rem;
+}
+.hamburger-btn div {
+    width: 2rem;
+    height: 0.25rem;
+    background: #ecf0f1;
+    border-radius: 10px;
+    transition: all 0.3s linear;
+}
+@media (max-width: 768px) {
+    .hamburger-btn {
+        display: flex;
+    }
+    [data-testid="stSidebar"] {
+        transform: translateX(-100%);
+        transition: transform 0.3s ease-in-out;
+        position: fixed !important;
+        height: 100vh !important;
+        z-index: 5;
+    }
+    [data-testid="stSidebar"].open {
+        transform: translateX(0);
+    }
+    [data-testid="collapsedControl"] {
+        display: none !important;
+    }
+}
+"""
+
+# Runs in the main page; the sidebar is looked up on use because it only exists after login
+HAMBURGER_JS = """
+(function () {
+    if (document.querySelector('.hamburger-btn')) {
+        return;
+    }
+    function sidebar() {
+        return document.querySelector('[data-testid="stSidebar"]');
+    }
+
+    // Create hamburger button
+    const hamburger = document.createElement('button');
+    hamburger.className = 'hamburger-btn';
+    hamburger.setAttribute('aria-label', 'Menu');
+    hamburger.innerHTML = '<div></div><div></div><div></div>';
+    document.body.appendChild(hamburger);
+
+    // Toggle sidebar
+    hamburger.addEventListener('click', function () {
+        const bar = sidebar();
+        if (bar) {
+            bar.classList.toggle('open');
+        }
+    });
+
+    // Close when clicking outside on mobile
+    document.addEventListener('click', function (event) {
+        const bar = sidebar();
+        if (bar && window.innerWidth <= 768 &&
+            !bar.contains(event.target) &&
+            !event.target.closest('.hamburger-btn') &&
+            bar.classList.contains('open')) {
+            bar.classList.remove('open');
+        }
+    });
+
+    // Ensure sidebar is visible on desktop
+    function handleResize() {
+        const bar = sidebar();
+        if (bar && window.innerWidth > 768) {
+            bar.classList.add('open');
+        }
+    }
+
+    window.addEventListener('resize', handleResize);
+    handleResize();
+})();
+"""
+
+
+def minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+def minify_js(js):
+    # Conservative: drop comment-only lines and indentation, keep line breaks for ASI
+    lines = (line.strip() for line in js.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//"))
+
+
+@lru_cache(maxsize=4)
+def _build(stylesheet_mtime):
+    try:
+        with open(STYLESHEET) as f:
+            stylesheet = f.read()
+    except FileNotFoundError:
+        stylesheet = ""
+    css = minify_css(stylesheet + TAB_CSS + HAMBURGER_CSS)
+    js = minify_js(HAMBURGER_JS)
+    fingerprint = hashlib.sha256(f"{css}\0{js}".encode()).hexdigest()[:12]
+    return {"css": css, "js": js, "fingerprint": fingerprint, "stylesheet_found": bool(stylesheet)}
+
+
+def bundle():
+    """The minified, fingerprinted bundle: {"css", "js", "fingerprint", "stylesheet_found"}"""
+    try:
+        mtime = os.path.getmtime(STYLESHEET)
+    except OSError:
+        mtime = None
+    return _build(mtime)
+
+
+@lru_cache(maxsize=4)
+def _injector(fingerprint, css, js):
+    return f"""<script>
+(function () {{
+    const doc = window.parent.document;
+    if (doc.getElementById("scholarmind-css-{fingerprint}")) {{
+        return;
+    }}
+    doc.querySelectorAll("[data-scholarmind-asset]").forEach(function (el) {{ el.remove(); }});
+    const style = doc.createElement("style");
+    style.id = "scholarmind-css-{fingerprint}";
+    style.setAttribute("data-scholarmind-asset", "{fingerprint}");
+    style.textContent = {json.dumps(css)};
+    doc.head.appendChild(style);
+    const script = doc.createElement("script");
+    script.setAttribute("data-scholarmind-asset", "{fingerprint}");
+    script.textContent = {json.dumps(js)};
+    doc.head.appendChild(script);
+}})();
+</script>"""
+
+
+def injector_html():
+    """Snippet that installs the current bundle into the parent page, unless it is already there"""
+    assets = bundle()
+    return _injector(assets["fingerprint"], assets["css"], assets["js"])
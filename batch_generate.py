@@ -0,0 +1,183 @@
+"""Generate research packs for a list of topics from the command line.
+
+Reads topics from a text file (one per line) or a CSV with a `topic` column and
+an optional `content_types` column (e.g. "abstract;questions"). Sections are
+generated through engine.py with bounded concurrency and a Gemini rate limit,
+saved to research_history for the chosen user, and written as markdown:
+<out>/<topic>/<content_type>.md per section plus <out>/<topic>.md per complete pack.
+
+Finished sections are recorded in a checkpoint file, so an interrupted run
+picks up where it stopped when started again with the same arguments.
+
+Usage:
+    python batch_generate.py topics.csv --user admin --out packs --concurrency 4 --rate-per-minute 30
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import engine
+import quotas
+import scheduling
+from database import DatabaseManager
+from exports import slugify
+
+
+def read_topics(path, default_types):
+    """[(topic, [content types])] in file order, merging duplicate topics"""
+    with open(path, encoding="utf-8-sig") as f:
+        text = f.read()
+    if path.lower().endswith(".csv"):
+        rows = [(row.get("topic") or "", row.get("content_types") or "") for row in csv.DictReader(text.splitlines())]
+    else:
+        rows = [(line, "") for line in text.splitlines()]
+
+    topics = {}
+    for topic, types in rows:
+        topic = topic.strip()
+        if not topic or topic.startswith("#"):
+            continue
+        wanted = [t for t in re.split(r"[;|, ]+", types.strip()) if t] or default_types
+        unknown = [t for t in wanted if t not in engine.CONTENT_TYPES]
+        if unknown:
+            raise ValueError(f"Unknown content types for '{topic}': {', '.join(unknown)}")
+        merged = topics.setdefault(topic, [])
+        merged.extend(t for t in wanted if t not in merged)
+    return list(topics.items())
+
+
+def load_checkpoint(path):
+    done = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    done[(entry["topic"], entry["content_type"])] = entry
+    return done
+
+
+def pack_dir(out_dir, topic):
+    return os.path.join(out_dir, slugify(topic))
+
+
+def write_section(out_dir, topic, content_type, content):
+    os.makedirs(pack_dir(out_dir, topic), exist_ok=True)
+    path = os.path.join(pack_dir(out_dir, topic), f"{content_type}.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return path
+
+
+def write_pack(out_dir, topic, content_types):
+    """Combine a topic's section files into one markdown pack"""
+    parts = [f"# {topic}\n"]
+    for content_type in content_types:
+        with open(os.path.join(pack_dir(out_dir, topic), f"{content_type}.md"), encoding="utf-8") as f:
+            parts.append(f"## {engine.CONTENT_TITLES[content_type]}\n\n{f.read().strip()}\n")
+    with open(os.path.join(out_dir, f"{slugify(topic)}.md"), "w", encoding="utf-8") as f:
+        f.write("\n".join(parts))
+
+
+def generate_section(topic, content_type, user_id, max_wait):
+    # Wait out the shared rate limit, backing off, for up to max_wait seconds; after that the
+    # section fails and is left out of the checkpoint, so the next run retries it
+    deadline = time.monotonic() + max_wait
+    delay = 1.0
+    while True:
+        try:
+            return engine.generate_research_content(topic, content_type, user=user_id, priority=scheduling.BATCH)
+        except engine.RateLimitExceeded as e:
+            if time.monotonic() + delay > deadline:
+                raise engine.RateLimitExceeded(f"still rate limited after {max_wait:.0f}s: {e}") from e
+            time.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+
+def run(args):
+    db = DatabaseManager(args.db)
+    conn = sqlite3.connect(args.db)
+    user = conn.execute("SELECT id FROM users WHERE username = ?", (args.user,)).fetchone()
+    conn.close()
+    if not user:
+        raise SystemExit(f"No user named '{args.user}'")
+
+    default_types = args.types.split(",") if args.types else list(engine.CONTENT_TYPES)
+    topics = read_topics(args.topics_file, default_types)
+    os.makedirs(args.out, exist_ok=True)
+    checkpoint_path = args.checkpoint or os.path.join(args.out, ".checkpoint.jsonl")
+    done = load_checkpoint(checkpoint_path)
+    jobs = [(topic, content_type) for topic, types in topics for content_type in types
+            if (topic, content_type) not in done]
+    print(f"{len(topics)} topics, {len(done)} sections already done, {len(jobs)} to generate", flush=True)
+
+    engine.rate_limiter = engine.RateLimiter(args.rate_per_minute)
+    # This process only runs this user's batch, so the per-user cap is the requested concurrency
+    engine.scheduler = scheduling.FairScheduler(args.concurrency, args.concurrency)
+    # Batch generations count against the user's quotas like interactive ones
+    engine.quota_tracker = quotas.QuotaTracker(args.db)
+    lock = threading.Lock()
+    failures = []
+    started = time.perf_counter()
+    with open(checkpoint_path, "a") as checkpoint, ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = {pool.submit(generate_section, topic, content_type, user[0], args.max_wait): (topic, content_type)
+                   for topic, content_type in jobs}
+        for finished, future in enumerate(as_completed(futures), start=1):
+            topic, content_type = futures[future]
+            try:
+                generation = future.result()
+            except Exception as e:
+                generation, error = None, str(e)
+            else:
+                error = None if generation.raw is not None else "generation failed after retries"
+            if error:
+                failures.append((topic, content_type, error))
+                print(f"[{finished}/{len(jobs)}] FAILED {topic} / {content_type}: {error}", flush=True)
+                continue
+
+            history_id = db.save_generation(user[0], topic, content_type, generation.raw, generation.version,
+                                         generation.fresh)
+            path = write_section(args.out, topic, content_type, generation.content)
+            with lock:
+                checkpoint.write(json.dumps({"topic": topic, "content_type": content_type,
+                                             "history_id": history_id, "file": path}) + "\n")
+                checkpoint.flush()
+                done[(topic, content_type)] = True
+            print(f"[{finished}/{len(jobs)}] {topic} / {content_type}", flush=True)
+
+    packs = 0
+    for topic, types in topics:
+        if all((topic, content_type) in done for content_type in types):
+            write_pack(args.out, topic, types)
+            packs += 1
+    print(f"Wrote {packs} complete packs to {args.out} in {time.perf_counter() - started:.1f}s; "
+          f"{len(failures)} sections failed" + (" (rerun the same command to retry them)" if failures else ""))
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-generate ScholarMind research packs")
+    parser.add_argument("topics_file", help="Text file with one topic per line, or CSV with topic[,content_types]")
+    parser.add_argument("--user", required=True, help="Username the generated history is saved for")
+    parser.add_argument("--out", default="packs", help="Directory for the markdown packs")
+    parser.add_argument("--types", help="Comma-separated content types when the file names none (default: all)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Sections generated at once")
+    parser.add_argument("--rate-per-minute", type=int, default=engine.RATE_LIMIT_PER_MINUTE,
+                        help="Gemini calls per minute")
+    parser.add_argument("--max-wait", type=float, default=300,
+                        help="Seconds a section waits out the rate limit before it counts as failed")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <out>/.checkpoint.jsonl)")
+    parser.add_argument("--db", default="scholarmind.db")
+    args = parser.parse_args()
+    sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
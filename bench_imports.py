@@ -0,0 +1,112 @@
+"""Import-time benchmark for the app's cold start.
+
+Runs the module-level imports of app.py in fresh interpreters under
+`python -X importtime`, reports the slowest top-level imports, and checks the
+median against import_budget.json:
+
+- max_total_ms: everything app.py imports, streamlit included
+- max_overhead_ms: what the app adds on top of streamlit. Streamlit is imported
+  first and only the imports after it count, within the same interpreter run,
+  so noise in streamlit's and the interpreter's own startup does not
+- lazy: modules that must not be imported at startup at all
+
+Exits with status 1 when the budget is exceeded.
+
+Usage:
+    python bench_imports.py [--runs 5] [--top 15] [--budget import_budget.json]
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def app_imports(path):
+    """Source of the module-level import statements of a script"""
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def measure(code):
+    """(total_us, {top-level module: cumulative_us}, every imported module) for one fresh interpreter"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=HERE, capture_output=True,
+                            text=True, check=True)
+    top, modules = {}, set()
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        modules.add(name)
+        # Nesting is shown by indentation; depth-0 entries add up to the whole import
+        if len(indent) <= 1:
+            top[name] = int(cumulative)
+    return sum(top.values()), top, modules
+
+
+def _after_streamlit(top):
+    """Cumulative time of the top-level imports that followed `import streamlit`"""
+    names = list(top)
+    return sum(top[name] for name in names[names.index("streamlit") + 1:])
+
+
+def run(code, runs):
+    """Medians over `runs` interpreters: (total_us, app overhead_us, streamlit_us, {top-level module: us}, modules)"""
+    code = "import streamlit\n" + code
+    measure(code)  # warm-up: writes .pyc files and fills the OS cache
+    samples = [measure(code) for _ in range(runs)]
+    median_total = statistics.median(total for total, _, _ in samples)
+    median_overhead = statistics.median(_after_streamlit(top) for _, top, _ in samples)
+    median_streamlit = statistics.median(top.get("streamlit", 0) for _, top, _ in samples)
+    tops = {}
+    for _, top, _ in samples:
+        for name, value in top.items():
+            tops.setdefault(name, []).append(value)
+    return (median_total, median_overhead, median_streamlit,
+            {name: statistics.median(values) for name, values in tops.items()}, samples[-1][2])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure and budget app.py's import time")
+    parser.add_argument("--app", default=os.path.join(HERE, "app.py"))
+    parser.add_argument("--budget", default=os.path.join(HERE, "import_budget.json"))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="How many of the slowest imports to list")
+    args = parser.parse_args()
+
+    with open(args.budget) as f:
+        budget = json.load(f)
+    total, overhead, baseline, top, modules = run(app_imports(args.app), args.runs)
+
+    print(f"{'import':<50} {'ms':>8}")
+    print("-" * 59)
+    for name, value in sorted(top.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<50} {value / 1000:>8.1f}")
+    print()
+    print(f"Total      {total / 1000:>8.1f} ms  (budget {budget['max_total_ms']} ms)")
+    print(f"Overhead   {overhead / 1000:>8.1f} ms  (budget {budget['max_overhead_ms']} ms, "
+          f"on top of {baseline / 1000:.1f} ms for streamlit)")
+
+    failures = []
+    if total / 1000 > budget["max_total_ms"]:
+        failures.append(f"total import time {total / 1000:.1f} ms exceeds {budget['max_total_ms']} ms")
+    if overhead / 1000 > budget["max_overhead_ms"]:
+        failures.append(f"app overhead {overhead / 1000:.1f} ms exceeds {budget['max_overhead_ms']} ms")
+    for name in budget.get("lazy", []):
+        if name in modules:
+            failures.append(f"{name} is imported at startup but should be lazy")
+    for failure in failures:
+        print(f"OVER BUDGET: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,924 @@
+import glob
+import hashlib
+import os
+import re
 import sqlite3
-from passlib.hash import pbkdf2_sha256
+import time
+import zlib
+from contextlib import closing
+
+from passwords import hash_password, verify_password
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib is always available
+    zstandard = None
+
+
+def _has_fts5():
+    try:
+        with closing(sqlite3.connect(':memory:')) as conn:
+            conn.execute("CREATE VIRTUAL TABLE probe USING fts5(body)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+# Full-text search falls back to topic LIKE matching on SQLite builds without FTS5
+HAS_FTS5 = _has_fts5()
+
+# Rows older than this many days are moved into per-month archive databases
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+
+# Leading format byte of compressed content; legacy rows are plain TEXT
+CONTENT_RAW = 0
+CONTENT_ZLIB = 1
+CONTENT_ZSTD = 2
+
+
+def compress_content(text):
+    """Encode research content as a format byte followed by the (compressed) payload"""
+    data = text.encode('utf-8')
+    if zstandard is not None:
+        packed = bytes([CONTENT_ZSTD]) + zstandard.ZstdCompressor(level=10).compress(data)
+    else:
+        packed = bytes([CONTENT_ZLIB]) + zlib.compress(data, 9)
+    # Very short texts don't shrink, keep them raw rather than paying for decompression
+    if len(packed) >= len(data) + 1:
+        return bytes([CONTENT_RAW]) + data
+    return packed
+
+
+def decompress_content(value):
+    """Decode content stored by compress_content, passing legacy TEXT through unchanged"""
+    if value is None or isinstance(value, str):
+        return value
+    fmt, payload = value[0], bytes(value[1:])
+    if fmt == CONTENT_RAW:
+        return payload.decode('utf-8')
+    if fmt == CONTENT_ZLIB:
+        return zlib.decompress(payload).decode('utf-8')
+    if fmt == CONTENT_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Content is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload).decode('utf-8')
+    raise ValueError(f"Unknown content format byte: {fmt}")
+
+
+def _ensure_column(c, table, column, decl):
+    c.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in c.fetchall()]:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def ensure_schema(c):
+    """Create or upgrade tables, indexes and triggers (idempotent)"""
+    # Users table
+    c.execute('''CREATE TABLE IF NOT EXISTS users
+                (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 username TEXT UNIQUE NOT NULL,
+                 password_hash TEXT NOT NULL,
+                 role TEXT NOT NULL,
+                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    # Admin user listing: newest first, optionally within one role
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_users_created
+                ON users (created_at DESC, id DESC)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_users_role_created
+                ON users (role, created_at DESC, id DESC)''')
+
+    # Research history table; new rows keep their text in content_blobs
+    c.execute('''CREATE TABLE IF NOT EXISTS research_history
+                (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 user_id INTEGER NOT NULL,
+                 topic TEXT NOT NULL,
+                 content_type TEXT NOT NULL,
+                 content TEXT NOT NULL,
+                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                 FOREIGN KEY(user_id) REFERENCES users(id))''')
+    _ensure_column(c, 'research_history', 'content_hash', 'TEXT')
+    # Prompt template version the content came from, for saving each generated section once per user
+    _ensure_column(c, 'research_history', 'prompt_version', 'TEXT')
+
+    # Keyset pagination index for research history
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_research_history_user_created
+                ON research_history (user_id, created_at DESC, id DESC)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_research_history_content_hash
+                ON research_history (content_hash)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_research_history_user_hash
+                ON research_history (user_id, content_hash)''')
+
+    # Content-addressed blobs shared by every history row with the same text
+    c.execute('''CREATE TABLE IF NOT EXISTS content_blobs
+                (hash TEXT PRIMARY KEY,
+                 content BLOB NOT NULL,
+                 size INTEGER NOT NULL,
+                 ref_count INTEGER NOT NULL DEFAULT 0,
+                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS research_history_release_blob
+                AFTER DELETE ON research_history
+                WHEN OLD.content_hash IS NOT NULL
+                BEGIN
+                    UPDATE content_blobs SET ref_count = ref_count - 1 WHERE hash = OLD.content_hash;
+                END''')
+
+    # Full-text index over topic and content; rows are added by store_research, which has
+    # the plain text at hand. The index is contentless and the text compressed, so a trigger
+    # can't remove an entry itself: the delete and update triggers queue the row's old
+    # values in pending_unindex, and _apply_pending_unindex drops those entries (re-adding
+    # rows that still exist) before the next save or search.
+    if HAS_FTS5:
+        created = _ensure_fts(c, "main")
+        c.execute("DROP TRIGGER IF EXISTS research_history_fts_delete")
+        c.execute("DROP TRIGGER IF EXISTS research_history_fts_topic")
+        c.execute('''CREATE TABLE IF NOT EXISTS pending_unindex
+                    (seq INTEGER PRIMARY KEY,
+                     row_id INTEGER NOT NULL,
+                     user_id INTEGER NOT NULL,
+                     topic TEXT NOT NULL,
+                     content BLOB NOT NULL)''')
+        c.execute('''CREATE TRIGGER IF NOT EXISTS research_history_unindex_delete
+                    AFTER DELETE ON research_history
+                    BEGIN
+                        INSERT INTO pending_unindex (row_id, user_id, topic, content)
+                        VALUES (OLD.id, OLD.user_id, OLD.topic,
+                                COALESCE((SELECT content FROM content_blobs WHERE hash = OLD.content_hash),
+                                         OLD.content));
+                    END''')
+        c.execute('''CREATE TRIGGER IF NOT EXISTS research_history_unindex_update
+                    AFTER UPDATE OF topic, user_id ON research_history
+                    WHEN OLD.topic IS NOT NEW.topic OR OLD.user_id IS NOT NEW.user_id
+                    BEGIN
+                        INSERT INTO pending_unindex (row_id, user_id, topic, content)
+                        VALUES (OLD.id, OLD.user_id, OLD.topic,
+                                COALESCE((SELECT content FROM content_blobs WHERE hash = OLD.content_hash),
+                                         OLD.content));
+                    END''')
+        if created:
+            rebuild_search_index(c)
+
+    # Usage rollups for admin analytics, bumped on every insert so reads never scan history
+    c.execute("SELECT 1 FROM sqlite_master WHERE name = 'usage_daily'")
+    rollups_created = c.fetchone() is None
+    c.execute('''CREATE TABLE IF NOT EXISTS usage_daily
+                (day TEXT NOT NULL,
+                 content_type TEXT NOT NULL,
+                 generations INTEGER NOT NULL DEFAULT 0,
+                 chars INTEGER NOT NULL DEFAULT 0,
+                 PRIMARY KEY (day, content_type)) WITHOUT ROWID''')
+    c.execute('''CREATE TABLE IF NOT EXISTS usage_user_daily
+                (user_id INTEGER NOT NULL,
+                 day TEXT NOT NULL,
+                 generations INTEGER NOT NULL DEFAULT 0,
+                 chars INTEGER NOT NULL DEFAULT 0,
+                 PRIMARY KEY (user_id, day)) WITHOUT ROWID''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_usage_user_daily_day
+                ON usage_user_daily (day)''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS research_history_usage_rollup
+                AFTER INSERT ON research_history
+                BEGIN
+                    INSERT INTO usage_daily (day, content_type, generations, chars)
+                    VALUES (date(NEW.created_at), NEW.content_type, 1,
+                            COALESCE((SELECT size FROM content_blobs WHERE hash = NEW.content_hash),
+                                     length(NEW.content)))
+                    ON CONFLICT(day, content_type) DO UPDATE
+                    SET generations = generations + 1, chars = chars + excluded.chars;
+
+                    INSERT INTO usage_user_daily (user_id, day, generations, chars)
+                    VALUES (NEW.user_id, date(NEW.created_at), 1,
+                            COALESCE((SELECT size FROM content_blobs WHERE hash = NEW.content_hash),
+                                     length(NEW.content)))
+                    ON CONFLICT(user_id, day) DO UPDATE
+                    SET generations = generations + 1, chars = chars + excluded.chars;
+                END''')
+    if rollups_created:
+        rebuild_usage_rollups(c)
+
+    # Which archive months hold rows for which user, so reads only attach files that matter
+    c.execute('''CREATE TABLE IF NOT EXISTS history_archive_index
+                (user_id INTEGER NOT NULL,
+                 month TEXT NOT NULL,
+                 rows INTEGER NOT NULL DEFAULT 0,
+                 PRIMARY KEY (user_id, month)) WITHOUT ROWID''')
+
+    # Key/value settings, such as the session signing secret
+    c.execute('''CREATE TABLE IF NOT EXISTS settings
+                (key TEXT PRIMARY KEY,
+                 value TEXT NOT NULL) WITHOUT ROWID''')
+
+    # Login sessions behind the signed tokens handed to browsers (see sessions.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS sessions
+                (id TEXT PRIMARY KEY,
+                 user_id INTEGER NOT NULL,
+                 created_at REAL NOT NULL,
+                 expires_at REAL NOT NULL,
+                 last_seen REAL NOT NULL,
+                 revoked INTEGER NOT NULL DEFAULT 0,
+                 state TEXT,
+                 FOREIGN KEY(user_id) REFERENCES users(id))''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_sessions_user
+                ON sessions (user_id)''')
+
+    # Failed-login counters behind the in-memory throttle (see throttle.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS login_attempts
+                (key TEXT PRIMARY KEY,
+                 failures TEXT NOT NULL,
+                 strikes INTEGER NOT NULL DEFAULT 0,
+                 locked_until REAL NOT NULL DEFAULT 0,
+                 updated_at REAL NOT NULL) WITHOUT ROWID''')
+
+    # Per-user generation counters and per-role limits behind the in-memory quotas (see quotas.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS usage_counters
+                (user_id INTEGER NOT NULL,
+                 period TEXT NOT NULL,
+                 requests INTEGER NOT NULL DEFAULT 0,
+                 tokens INTEGER NOT NULL DEFAULT 0,
+                 PRIMARY KEY (user_id, period)) WITHOUT ROWID''')
+    c.execute('''CREATE TABLE IF NOT EXISTS role_quotas
+                (role TEXT NOT NULL,
+                 period TEXT NOT NULL,
+                 max_requests INTEGER NOT NULL,
+                 max_tokens INTEGER NOT NULL,
+                 PRIMARY KEY (role, period)) WITHOUT ROWID''')
+
+
+def archive_dir_for(db_name):
+    """Directory holding the monthly archive files of a database"""
+    return os.getenv("ARCHIVE_DIR") or os.path.join(os.path.dirname(os.path.abspath(db_name)), "archive")
+
+
+def archive_path(archive_dir, month):
+    return os.path.join(archive_dir, f"history_{month.replace('-', '_')}.db")
+
+
+def _ensure_archive_schema(c, schema):
+    # Archived rows are self-contained: content is stored inline, compressed
+    c.execute(f'''CREATE TABLE IF NOT EXISTS {schema}.research_history
+                (id INTEGER PRIMARY KEY,
+                 user_id INTEGER NOT NULL,
+                 topic TEXT NOT NULL,
+                 content_type TEXT NOT NULL,
+                 content BLOB NOT NULL,
+                 size INTEGER NOT NULL,
+                 created_at TIMESTAMP NOT NULL)''')
+    c.execute(f'''CREATE INDEX IF NOT EXISTS {schema}.idx_research_history_user_created
+                ON research_history (user_id, created_at DESC, id DESC)''')
+    if HAS_FTS5 and _ensure_fts(c, schema):
+        c.execute(f"SELECT id, topic, content, user_id FROM {schema}.research_history")
+        _index_rows(c, schema, [(row_id, topic, decompress_content(content), user_id)
+                                for row_id, topic, content, user_id in c.fetchall()])
+
+
+def _archive_months(c, user_id, before=None):
+    c.execute("SELECT month FROM history_archive_index WHERE user_id = ? AND month <= ? ORDER BY month DESC",
+              (user_id, before[0][:7] if before else "9999-12"))
+    return [row[0] for row in c.fetchall()]
+
+
+def _attach_archive(c, archive_dir, month):
+    path = archive_path(archive_dir, month)
+    if not os.path.exists(path):
+        return False
+    c.execute("ATTACH DATABASE ? AS cold", (path,))
+    return True
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def acquire_blob(c, content):
+    """Take a reference on the blob holding `content`, creating it if needed.
+
+    Known content only bumps a reference count; the text is compressed and
+    stored once, the first time it is seen. Returns the content hash.
+    """
+    digest = content_hash(content)
+    c.execute("UPDATE content_blobs SET ref_count = ref_count + 1 WHERE hash = ?", (digest,))
+    if c.rowcount == 0:
+        c.execute("""
+            INSERT INTO content_blobs (hash, content, size, ref_count) VALUES (?, ?, ?, 1)
+            ON CONFLICT(hash) DO UPDATE SET ref_count = ref_count + 1
+        """, (digest, compress_content(content), len(content)))
+    return digest
+
+
+def store_research(c, user_id, topic, content_type, content, prompt_version=None):
+    """Insert a history row pointing at the shared blob for its content. Returns the new id."""
+    digest = acquire_blob(c, content)
+    c.execute("INSERT INTO research_history "
+              "(user_id, topic, content_type, content, content_hash, prompt_version) VALUES (?, ?, ?, '', ?, ?)",
+              (user_id, topic, content_type, digest, prompt_version))
+    history_id = c.lastrowid
+    if HAS_FTS5:
+        _apply_pending_unindex(c)
+        _index_rows(c, "main", [(history_id, topic, content, user_id)])
+    return history_id
+
+
+def store_research_once(c, user_id, topic, content_type, content, prompt_version, fresh=False):
+    """Save a generated section. Returns (history id, whether it was added).
+
+    Fresh output from the model is always saved. A section served from the
+    generation cache is skipped when the user already has a row with the same
+    content, so it is saved once for each user who gets it.
+    """
+    if not fresh:
+        c.execute("SELECT id FROM research_history WHERE user_id = ? AND content_hash = ? LIMIT 1",
+                  (user_id, content_hash(content)))
+        row = c.fetchone()
+        if row:
+            return row[0], False
+    return store_research(c, user_id, topic, content_type, content, prompt_version), True
+
+
+def read_research_content(c, history_id, user_id=None):
+    """Return the decoded content of a history row, or None if it doesn't exist (or isn't user_id's)"""
+    c.execute("""
+        SELECT COALESCE(b.content, h.content)
+        FROM research_history h
+        LEFT JOIN content_blobs b ON b.hash = h.content_hash
+        WHERE h.id = ? AND (? IS NULL OR h.user_id = ?)
+    """, (history_id, user_id, user_id))
+    result = c.fetchone()
+    return decompress_content(result[0]) if result else None
+
+
+def _user_filters(prefix, role):
+    filters, params = [], []
+    if prefix:
+        # A range on the unique username index instead of an unindexable LIKE
+        filters.append("username >= ? AND username < ?")
+        params += [prefix, prefix + chr(0x10FFFF)]
+    if role:
+        filters.append("role = ?")
+        params.append(role)
+    return (" WHERE " + " AND ".join(filters)) if filters else "", params
+
+
+def list_users(c, prefix="", role=None, after=None, limit=25):
+    """One page of (id, username, role, created_at) users, newest first.
+
+    Pass the (created_at, id) of the last user seen as `after` to fetch the next page.
+    """
+    where, params = _user_filters(prefix, role)
+    if after:
+        where += (" AND " if where else " WHERE ") + "(created_at, id) < (?, ?)"
+        params += [after[0], after[1]]
+    c.execute(f"""
+        SELECT id, username, role, created_at
+        FROM users
+        {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    """, params + [limit])
+    return c.fetchall()
+
+
+def count_users(c, prefix="", role=None):
+    where, params = _user_filters(prefix, role)
+    c.execute(f"SELECT COUNT(*) FROM users {where}", params)
+    return c.fetchone()[0]
+
+
+def fetch_history_page(c, user_id, before=None, limit=50, schema="main"):
+    """One page of a user's history metadata, newest first.
+
+    Pass the (created_at, id) of the last row seen as `before` to fetch the next page.
+    """
+    if before:
+        c.execute(f"""
+            SELECT id, topic, content_type, created_at
+            FROM {schema}.research_history
+            WHERE user_id = ? AND (created_at, id) < (?, ?)
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, (user_id, before[0], before[1], limit))
+    else:
+        c.execute(f"""
+            SELECT id, topic, content_type, created_at
+            FROM {schema}.research_history
+            WHERE user_id = ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, (user_id, limit))
+    return c.fetchall()
+
+
+def fetch_archived_history(c, archive_dir, user_id, before=None, limit=50):
+    """Continue a history listing into the monthly archives, newest month first.
+
+    Archive files are attached one at a time and only for months holding the
+    user's rows. Rows carry their archive month as a fifth column.
+    """
+    rows = []
+    for month in _archive_months(c, user_id, before):
+        if not _attach_archive(c, archive_dir, month):
+            continue
+        try:
+            page = fetch_history_page(c, user_id, before, limit - len(rows), schema="cold")
+        finally:
+            c.execute("DETACH DATABASE cold")
+        rows.extend(row + (month,) for row in page)
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+def read_archived_content(c, archive_dir, month, history_id, user_id=None):
+    """Return the decoded content of an archived history row (only if it is user_id's, when given)"""
+    if not _attach_archive(c, archive_dir, month):
+        return None
+    try:
+        c.execute("SELECT content FROM cold.research_history WHERE id = ? AND (? IS NULL OR user_id = ?)",
+                  (history_id, user_id, user_id))
+        result = c.fetchone()
+    finally:
+        c.execute("DETACH DATABASE cold")
+    return decompress_content(result[0]) if result else None
+
+
+def iter_research_export(conn, user_id, content_type=None, archive_dir=None, batch_size=100):
+    """Yield (id, topic, content_type, created_at, content, archive_month) for a user's history.
+
+    Rows come in small batches, hot rows first, then each archive month, so memory
+    use does not grow with history size. Hot rows are read one keyset page per
+    query, so no read lock on the live database is held between batches.
+    """
+    filters = " AND h.content_type = ?" if content_type else ""
+    params = [user_id] + ([content_type] if content_type else [])
+    before = ("9999-12-31", 0)
+    while True:
+        rows = conn.execute(f"""
+            SELECT h.id, h.topic, h.content_type, h.created_at, COALESCE(b.content, h.content)
+            FROM research_history h
+            LEFT JOIN content_blobs b ON b.hash = h.content_hash
+            WHERE h.user_id = ? {filters} AND (h.created_at, h.id) < (?, ?)
+            ORDER BY h.created_at DESC, h.id DESC
+            LIMIT ?
+        """, params + [before[0], before[1], batch_size]).fetchall()
+        for row_id, topic, row_type, created_at, stored in rows:
+            yield row_id, topic, row_type, created_at, decompress_content(stored), None
+        if len(rows) < batch_size:
+            break
+        before = (rows[-1][3], rows[-1][0])
+    if not archive_dir:
+        return
+
+    c = conn.cursor()
+    for month in _archive_months(c, user_id):
+        if not _attach_archive(c, archive_dir, month):
+            continue
+        try:
+            reader = conn.execute(f"""
+                SELECT h.id, h.topic, h.content_type, h.created_at, h.content
+                FROM cold.research_history h
+                WHERE h.user_id = ? {filters}
+                ORDER BY h.created_at DESC, h.id DESC
+            """, params)
+            for rows in iter(lambda: reader.fetchmany(batch_size), []):
+                for row_id, topic, row_type, created_at, stored in rows:
+                    yield row_id, topic, row_type, created_at, decompress_content(stored), month
+            reader.close()
+        finally:
+            c.execute("DETACH DATABASE cold")
+
+
+def history_fingerprint(c, user_id, content_type=None):
+    """Cheap token that changes whenever a user's history gains, loses or archives rows"""
+    filters = " AND content_type = ?" if content_type else ""
+    params = [user_id] + ([content_type] if content_type else [])
+    c.execute(f"SELECT COUNT(*), COALESCE(MAX(id), 0) FROM research_history WHERE user_id = ? {filters}", params)
+    count, max_id = c.fetchone()
+    c.execute("SELECT COALESCE(SUM(rows), 0) FROM history_archive_index WHERE user_id = ?", (user_id,))
+    return f"{count}-{max_id}-{c.fetchone()[0]}"
+
+
+def archive_old_history(conn, archive_dir, max_age_days=ARCHIVE_AFTER_DAYS, batch_size=500, pause=0.05):
+    """Move history rows older than `max_age_days` into per-month archive files.
+
+    Works in small batches, each one a short transaction over the hot database
+    and one attached archive, so live writers are only briefly blocked. Rows are
+    upserted into the archive before being deleted, so an interrupted run can
+    simply be repeated. Returns the number of rows archived.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    c = conn.cursor()
+    archived = 0
+    while True:
+        c.execute("""
+            SELECT h.id, h.user_id, h.topic, h.content_type, COALESCE(b.content, h.content),
+                   COALESCE(b.size, length(h.content)), h.created_at
+            FROM research_history h
+            LEFT JOIN content_blobs b ON b.hash = h.content_hash
+            WHERE h.created_at < datetime('now', ?)
+            ORDER BY h.id
+            LIMIT ?
+        """, (f"-{max_age_days} days", batch_size))
+        rows = c.fetchall()
+        if not rows:
+            return archived
+
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row[6][:7], []).append(row)
+
+        for month, month_rows in by_month.items():
+            c.execute("ATTACH DATABASE ? AS cold", (archive_path(archive_dir, month),))
+            try:
+                _ensure_archive_schema(c, "cold")
+                archive_rows = []
+                for row_id, user_id, topic, content_type, stored, size, created_at in month_rows:
+                    # Legacy TEXT rows get compressed on the way out
+                    if isinstance(stored, str):
+                        stored = compress_content(stored)
+                    archive_rows.append((row_id, user_id, topic, content_type, stored, size, created_at))
+                if HAS_FTS5:
+                    # Rows archived before by an interrupted run are replaced, and so are their index entries
+                    placeholders = ",".join("?" * len(archive_rows))
+                    c.execute(f"SELECT id, topic, content, user_id FROM cold.research_history "
+                              f"WHERE id IN ({placeholders})", [row[0] for row in archive_rows])
+                    _unindex_rows(c, "cold", [(row_id, topic, decompress_content(content), user_id)
+                                              for row_id, topic, content, user_id in c.fetchall()])
+                c.executemany("INSERT OR REPLACE INTO cold.research_history "
+                              "(id, user_id, topic, content_type, content, size, created_at) "
+                              "VALUES (?, ?, ?, ?, ?, ?, ?)", archive_rows)
+                if HAS_FTS5:
+                    _index_rows(c, "cold", [(row[0], row[2], decompress_content(row[4]), row[1])
+                                            for row in archive_rows])
+                counts = {}
+                for row in archive_rows:
+                    counts[row[1]] = counts.get(row[1], 0) + 1
+                c.executemany("""
+                    INSERT INTO history_archive_index (user_id, month, rows) VALUES (?, ?, ?)
+                    ON CONFLICT(user_id, month) DO UPDATE SET rows = rows + excluded.rows
+                """, [(user_id, month, count) for user_id, count in counts.items()])
+                # Triggers release the blob references and queue the rows' removal from the index
+                c.executemany("DELETE FROM research_history WHERE id = ?", [(row[0],) for row in archive_rows])
+                if HAS_FTS5:
+                    _apply_pending_unindex(c)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                c.execute("DETACH DATABASE cold")
+        archived += len(rows)
+        time.sleep(pause)
+
+
+def _owner_token(user_id):
+    # Indexed alongside the text so per-user filtering happens inside the FTS query
+    return f"u{user_id}"
+
+
+def _ensure_fts(c, schema):
+    """Create the full-text table in `schema`; returns True when it is new and needs filling.
+
+    The table is contentless: it keeps the tokens but not a second copy of every
+    text. Tables from before that are dropped and rebuilt.
+    """
+    c.execute(f"SELECT sql FROM {schema}.sqlite_master WHERE name = 'research_fts'")
+    row = c.fetchone()
+    if row and "content=''" not in row[0]:
+        c.execute(f"DROP TABLE {schema}.research_fts")
+        row = None
+    c.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.research_fts
+                USING fts5(topic, content, owner, content='', tokenize='porter unicode61')''')
+    return row is None
+
+
+def _index_rows(c, schema, rows):
+    """Add (id, topic, text, user_id) rows to the full-text index"""
+    c.executemany(f"INSERT INTO {schema}.research_fts (rowid, topic, content, owner) VALUES (?, ?, ?, ?)",
+                  [(row_id, topic, text, _owner_token(user_id)) for row_id, topic, text, user_id in rows])
+
+
+def _unindex_rows(c, schema, rows):
+    """Remove (id, topic, text, user_id) rows from the full-text index.
+
+    A contentless index can only drop a row given the exact text it was indexed
+    with, and deleting a row it doesn't have corrupts it, so each row is looked
+    up first (e.g. a database seeded without the index).
+    """
+    for row_id, topic, text, user_id in rows:
+        owner = _owner_token(user_id)
+        c.execute(f"SELECT 1 FROM {schema}.research_fts WHERE research_fts MATCH ? AND rowid = ?",
+                  (f"owner:{owner}", row_id))
+        if c.fetchone():
+            c.execute(f"INSERT INTO {schema}.research_fts (research_fts, rowid, topic, content, owner) "
+                      f"VALUES ('delete', ?, ?, ?, ?)", (row_id, topic, text, owner))
+
+
+def _apply_pending_unindex(c):
+    """Drop the index entries of rows the triggers queued in pending_unindex.
+
+    Rows that still exist had their topic or owner changed and are indexed again
+    as they are now. A row queued more than once is removed with its oldest
+    values, the ones it was last indexed with.
+    """
+    c.execute("SELECT 1 FROM pending_unindex LIMIT 1")
+    if not c.fetchone():
+        return
+    # Deleting first takes the write lock, so nothing queued meanwhile is lost
+    c.execute("DELETE FROM pending_unindex RETURNING seq, row_id, user_id, topic, content")
+    oldest = {}
+    for seq, row_id, user_id, topic, content in sorted(c.fetchall()):
+        oldest.setdefault(row_id, (row_id, topic, content, user_id))
+    _unindex_rows(c, "main", [(row_id, topic, decompress_content(content), user_id)
+                              for row_id, topic, content, user_id in oldest.values()])
+    placeholders = ",".join("?" * len(oldest))
+    c.execute(f"""
+        SELECT h.id, h.topic, COALESCE(b.content, h.content), h.user_id
+        FROM research_history h
+        LEFT JOIN content_blobs b ON b.hash = h.content_hash
+        WHERE h.id IN ({placeholders})
+    """, list(oldest))
+    _index_rows(c, "main", [(row_id, topic, decompress_content(content), user_id)
+                            for row_id, topic, content, user_id in c.fetchall()])
+
+
+def _stem(word):
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def _snippet(text, query, words=16):
+    """About `words` words of `text` from just before the first query term, terms in **bold**.
+
+    Terms match words sharing a rough stem, close to what the porter tokenizer matched.
+    """
+    stems = {_stem(term) for term in re.findall(r"\w+", query.lower())}
+
+    def mark(match):
+        return f"**{match.group()}**" if _stem(match.group().lower()) in stems else match.group()
+
+    tokens = text.split()
+    first = next((i for i, token in enumerate(tokens)
+                  if any(_stem(part) in stems for part in re.findall(r"\w+", token.lower()))), 0)
+    start = max(0, min(first - words // 4, len(tokens) - words))
+    shown = " ".join(re.sub(r"\w+", mark, token) for token in tokens[start:start + words])
+    return ("…" if start > 0 else "") + shown + ("…" if start + words < len(tokens) else "")
+
+
+def _fts_query(query):
+    """Quote every term so user input can't trip FTS5 query syntax; terms are ANDed"""
+    terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+    return " ".join(terms)
+
+
+def rebuild_search_index(c):
+    """Repopulate research_fts from research_history in batches"""
+    c.execute("INSERT INTO research_fts (research_fts) VALUES ('delete-all')")
+    c.execute("DELETE FROM pending_unindex")
+    reader = c.connection.execute("""
+        SELECT h.id, h.topic, COALESCE(b.content, h.content), h.user_id
+        FROM research_history h
+        LEFT JOIN content_blobs b ON b.hash = h.content_hash
+    """)
+    while True:
+        rows = reader.fetchmany(500)
+        if not rows:
+            break
+        _index_rows(c, "main", [(row_id, topic, decompress_content(content), user_id)
+                                for row_id, topic, content, user_id in rows])
+
+
+def _search_fts(c, schema, query, match, filters, params, limit, order="rank"):
+    # The index is contentless, so snippets come from the stored text: a blob in the
+    # hot database, compressed inline in an archive
+    stored, blobs = (("COALESCE(b.content, h.content)", "LEFT JOIN content_blobs b ON b.hash = h.content_hash")
+                     if schema == "main" else ("h.content", ""))
+    c.execute(f"""
+        SELECT h.id, h.topic, h.content_type, h.created_at, {stored}, bm25(research_fts, 4.0, 1.0, 0.0) AS rank
+        FROM {schema}.research_fts
+        JOIN {schema}.research_history h ON h.id = research_fts.rowid
+        {blobs}
+        WHERE research_fts MATCH ? {filters}
+        ORDER BY {order}
+        LIMIT ?
+    """, [match] + params + [limit])
+    return [row[:4] + (_snippet(decompress_content(row[4]), query),) + row[5:] for row in c.fetchall()]
+
+
+def search_research(c, user_id, query, content_type=None, date_from=None, date_to=None, limit=20, offset=0,
+                    archive_dir=None):
+    """Search a user's history, best matches first.
+
+    Returns (id, topic, content_type, created_at, snippet, archive_month) rows; the
+    snippet marks matched terms in **bold** and archive_month is None for rows in
+    the hot table. Dates are inclusive 'YYYY-MM-DD' strings. Archives are only
+    searched when `archive_dir` is given, and then results are newest first:
+    bm25 scores from separate indexes use different statistics and can't be merged.
+    """
+    if not query.split():
+        return []
+    filters = ""
+    params = []
+    if content_type:
+        filters += " AND h.content_type = ?"
+        params.append(content_type)
+    if date_from:
+        filters += " AND h.created_at >= ?"
+        params.append(str(date_from))
+    if date_to:
+        filters += " AND h.created_at < date(?, '+1 day')"
+        params.append(str(date_to))
+
+    if not HAS_FTS5:
+        c.execute(f"""
+            SELECT h.id, h.topic, h.content_type, h.created_at, '', NULL
+            FROM research_history h
+            WHERE h.user_id = ? AND h.topic LIKE ? {filters}
+            ORDER BY h.created_at DESC, h.id DESC
+            LIMIT ? OFFSET ?
+        """, [user_id, f"%{query.strip()}%"] + params + [limit, offset])
+        return c.fetchall()
+
+    # Stale entries would still count toward bm25 and the limit + offset window
+    _apply_pending_unindex(c)
+    match = f"({_fts_query(query)}) AND owner:{_owner_token(user_id)}"
+    order = "h.created_at DESC, h.id DESC" if archive_dir else "rank"
+    results = [row + (None,) for row in _search_fts(c, "main", query, match, filters, params, limit + offset,
+                                                    order)]
+    if archive_dir:
+        months = _archive_months(c, user_id, (str(date_to),) if date_to else None)
+        for month in months:
+            if date_from and month < str(date_from)[:7]:
+                break
+            if not _attach_archive(c, archive_dir, month):
+                continue
+            try:
+                results.extend(row + (month,) for row in _search_fts(c, "cold", query, match, filters, params,
+                                                                      limit + offset, order))
+            finally:
+                c.execute("DETACH DATABASE cold")
+        results.sort(key=lambda row: (row[3], row[0]), reverse=True)
+    return [row[:5] + row[6:] for row in results[offset:offset + limit]]
+
+
+def rebuild_usage_rollups(c, archive_dir=None):
+    """Recompute the usage rollup tables from research_history and its archives.
+
+    The totals are built in temp tables and swapped in with the hot history in one
+    transaction, which the caller commits, so readers never see half-built rollups.
+    """
+    c.execute("DROP TABLE IF EXISTS temp.rebuilt_usage_daily")
+    c.execute("DROP TABLE IF EXISTS temp.rebuilt_usage_user_daily")
+    c.execute('''CREATE TEMP TABLE rebuilt_usage_daily
+                (day TEXT NOT NULL,
+                 content_type TEXT NOT NULL,
+                 generations INTEGER NOT NULL,
+                 chars INTEGER NOT NULL,
+                 PRIMARY KEY (day, content_type))''')
+    c.execute('''CREATE TEMP TABLE rebuilt_usage_user_daily
+                (user_id INTEGER NOT NULL,
+                 day TEXT NOT NULL,
+                 generations INTEGER NOT NULL,
+                 chars INTEGER NOT NULL,
+                 PRIMARY KEY (user_id, day))''')
+    for path in sorted(glob.glob(os.path.join(archive_dir, "history_*.db"))) if archive_dir else []:
+        c.execute("ATTACH DATABASE ? AS cold", (path,))
+        try:
+            _add_usage(c, "cold.research_history h", "h.size")
+            # An attached database cannot be detached mid-transaction; this commits only temp tables
+            c.connection.commit()
+        finally:
+            c.execute("DETACH DATABASE cold")
+
+    # The hot rows are read in the swapping transaction, so no insert in between is lost
+    if not c.connection.in_transaction:
+        c.execute("BEGIN IMMEDIATE")
+    _add_usage(c, "main.research_history h LEFT JOIN content_blobs b ON b.hash = h.content_hash",
+               "COALESCE(b.size, length(h.content))")
+    c.execute("DELETE FROM usage_daily")
+    c.execute("INSERT INTO usage_daily (day, content_type, generations, chars) "
+              "SELECT day, content_type, generations, chars FROM temp.rebuilt_usage_daily")
+    c.execute("DELETE FROM usage_user_daily")
+    c.execute("INSERT INTO usage_user_daily (user_id, day, generations, chars) "
+              "SELECT user_id, day, generations, chars FROM temp.rebuilt_usage_user_daily")
+    c.execute("DROP TABLE temp.rebuilt_usage_daily")
+    c.execute("DROP TABLE temp.rebuilt_usage_user_daily")
+
+
+def _add_usage(c, source, size):
+    c.execute(f"""
+        INSERT INTO temp.rebuilt_usage_daily (day, content_type, generations, chars)
+        SELECT date(h.created_at), h.content_type, COUNT(*), SUM({size})
+        FROM {source}
+        GROUP BY date(h.created_at), h.content_type
+        ON CONFLICT(day, content_type) DO UPDATE
+        SET generations = generations + excluded.generations, chars = chars + excluded.chars
+    """)
+    c.execute(f"""
+        INSERT INTO temp.rebuilt_usage_user_daily (user_id, day, generations, chars)
+        SELECT h.user_id, date(h.created_at), COUNT(*), SUM({size})
+        FROM {source}
+        GROUP BY h.user_id, date(h.created_at)
+        ON CONFLICT(user_id, day) DO UPDATE
+        SET generations = generations + excluded.generations, chars = chars + excluded.chars
+    """)
+
+
+def hot_topics(c, days=7, limit=5):
+    """The (topic, content_type) pairs generated most often in the last `days` days"""
+    c.execute("""
+        SELECT topic, content_type
+        FROM research_history
+        WHERE created_at >= datetime('now', ?)
+        GROUP BY lower(topic), content_type
+        ORDER BY COUNT(*) DESC
+        LIMIT ?
+    """, (f"-{days} days", limit))
+    return c.fetchall()
+
+
+def usage_rollups(c, days=30):
+    """Read the last `days` days of usage from the rollup tables.
+
+    Returns (daily, top_users, active_users): daily is (day, content_type,
+    generations, chars) rows, top_users is (username, generations, chars) for the
+    ten busiest users and active_users counts users with any generation.
+    """
+    since = f"-{days - 1} days"
+    c.execute("""
+        SELECT day, content_type, generations, chars
+        FROM usage_daily
+        WHERE day >= date('now', ?)
+        ORDER BY day
+    """, (since,))
+    daily = c.fetchall()
+    c.execute("""
+        SELECT COALESCE(u.username, '#' || r.user_id), SUM(r.generations), SUM(r.chars)
+        FROM usage_user_daily r
+        LEFT JOIN users u ON u.id = r.user_id
+        WHERE r.day >= date('now', ?)
+        GROUP BY r.user_id
+        ORDER BY SUM(r.generations) DESC
+        LIMIT 10
+    """, (since,))
+    top_users = c.fetchall()
+    c.execute("SELECT COUNT(DISTINCT user_id) FROM usage_user_daily WHERE day >= date('now', ?)", (since,))
+    return daily, top_users, c.fetchone()[0]
+
 
 class DatabaseManager:
     def __init__(self, db_name='scholarmind.db'):
         self.db_name = db_name
+        self.archive_dir = archive_dir_for(db_name)
         self._init_db()
 
+    def _connect(self, timeout=5.0):
+        """Open a connection; the single place to change how connections are made"""
+        return sqlite3.connect(self.db_name, timeout=timeout)
+
     def _init_db(self):
         """Initialize the database with required tables"""
-        with sqlite3.connect(self.db_name) as conn:
+        with self._connect() as conn:
             c = conn.cursor()
             
-            # Users table
-            c.execute('''CREATE TABLE IF NOT EXISTS users
-                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                         username TEXT UNIQUE NOT NULL,
-                         password_hash TEXT NOT NULL,
-                         role TEXT NOT NULL,
-                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-            
-            # Research history table
-            c.execute('''CREATE TABLE IF NOT EXISTS research_history
-                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                         user_id INTEGER NOT NULL,
-                         topic TEXT NOT NULL,
-                         content_type TEXT NOT NULL,
-                         content TEXT NOT NULL,
-                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                         FOREIGN KEY(user_id) REFERENCES users(id))''')
-            
+            ensure_schema(c)
+
             # Create admin user if none exists
             c.execute("SELECT COUNT(*) FROM users WHERE role='admin'")
             if c.fetchone()[0] == 0:
-                admin_hash = pbkdf2_sha256.hash("admin123")
+                admin_hash = hash_password("admin123")
                 c.execute("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
                           ("admin", admin_hash, "admin"))
             
             conn.commit()
 
     def authenticate_user(self, username, password):
-        """Authenticate a user"""
-        with sqlite3.connect(self.db_name) as conn:
+        """Authenticate a user, upgrading the stored hash if the hashing parameters changed"""
+        with self._connect() as conn:
             c = conn.cursor()
             c.execute("SELECT id, username, password_hash, role FROM users WHERE username = ?", (username,))
             user = c.fetchone()
-            
-            if user and pbkdf2_sha256.verify(password, user[2]):
-                return {
-                    'id': user[0],
-                    'username': user[1],
-                    'role': user[3],
-                    'is_admin': user[3] == 'admin'
-                }
+
+        if not user:
+            return None
+        valid, new_hash = verify_password(password, user[2])
+        if not valid:
             return None
+        if new_hash:
+            with self._connect() as conn:
+                conn.execute("UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?",
+                             (new_hash, user[0], user[2]))
+                conn.commit()
+        return {
+            'id': user[0],
+            'username': user[1],
+            'role': user[3],
+            'is_admin': user[3] == 'admin'
+        }
 
     def add_user(self, username, password, role):
         """Add a new user"""
+        password_hash = hash_password(password)
         try:
-            with sqlite3.connect(self.db_name) as conn:
+            with self._connect() as conn:
                 c = conn.cursor()
-                password_hash = pbkdf2_sha256.hash(password)
                 c.execute("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
                           (username, password_hash, role))
                 conn.commit()
@@ -69,36 +928,143 @@ class DatabaseManager:
 
     def get_all_users(self):
         """Get all users"""
-        with sqlite3.connect(self.db_name) as conn:
+        with self._connect() as conn:
             c = conn.cursor()
             c.execute("SELECT id, username, role FROM users ORDER BY created_at DESC")
             return c.fetchall()
 
+    def list_users(self, prefix="", role=None, after=None, limit=25):
+        """Get one page of users, optionally filtered by username prefix and role"""
+        with self._connect() as conn:
+            return list_users(conn.cursor(), prefix, role, after, limit)
+
+    def count_users(self, prefix="", role=None):
+        """Count users matching the same filters as list_users"""
+        with self._connect() as conn:
+            return count_users(conn.cursor(), prefix, role)
+
     def save_research(self, user_id, topic, content_type, content):
         """Save research content to history"""
-        with sqlite3.connect(self.db_name) as conn:
+        with self._connect() as conn:
             c = conn.cursor()
-            c.execute("INSERT INTO research_history (user_id, topic, content_type, content) VALUES (?, ?, ?, ?)",
-                      (user_id, topic, content_type, content))
+            history_id = store_research(c, user_id, topic, content_type, content)
             conn.commit()
+            return history_id
 
-    def get_research_history(self, user_id, limit=50):
-        """Get user's research history"""
-        with sqlite3.connect(self.db_name) as conn:
+    def save_generation(self, user_id, topic, content_type, content, prompt_version, fresh=False):
+        """Save a generated section to the user's history (cached ones once); returns its history id"""
+        with self._connect() as conn:
             c = conn.cursor()
-            c.execute("""
-                SELECT id, topic, content_type, created_at 
-                FROM research_history 
-                WHERE user_id = ?
-                ORDER BY created_at DESC
-                LIMIT ?
-            """, (user_id, limit))
-            return c.fetchall()
+            history_id, _ = store_research_once(c, user_id, topic, content_type, content, prompt_version, fresh)
+            conn.commit()
+            return history_id
+
+    def save_research_batch(self, items):
+        """Save many (user_id, topic, content_type, content) items in one transaction"""
+        with self._connect() as conn:
+            c = conn.cursor()
+            history_ids = [store_research(c, *item) for item in items]
+            conn.commit()
+            return history_ids
+
+    def get_research_history(self, user_id, limit=50, before=None, include_archive=False):
+        """Get user's research history (metadata only), newest first.
 
-    def get_research_content(self, history_id):
-        """Get specific research content"""
-        with sqlite3.connect(self.db_name) as conn:
+        Pass the (created_at, id) of the last row seen as `before` to fetch the next page.
+        With include_archive, a short page is topped up from the monthly archives;
+        archived rows carry their archive month as a fifth column.
+        """
+        with self._connect() as conn:
             c = conn.cursor()
-            c.execute("SELECT content FROM research_history WHERE id = ?", (history_id,))
-            result = c.fetchone()
-            return result[0] if result else None
\ No newline at end of file
+            rows = fetch_history_page(c, user_id, before, limit)
+            if include_archive and len(rows) < limit:
+                cursor = (rows[-1][3], rows[-1][0]) if rows else before
+                rows += fetch_archived_history(c, self.archive_dir, user_id, cursor, limit - len(rows))
+            return rows
+
+    def get_research_content(self, history_id, archive_month=None, user_id=None):
+        """Get specific research content; with user_id, only if that user owns it"""
+        with self._connect() as conn:
+            c = conn.cursor()
+            if archive_month:
+                return read_archived_content(c, self.archive_dir, archive_month, history_id, user_id)
+            return read_research_content(c, history_id, user_id)
+
+    def search_research(self, user_id, query, content_type=None, date_from=None, date_to=None,
+                        limit=20, offset=0, include_archive=False):
+        """Full-text search over a user's research history"""
+        with self._connect() as conn:
+            return search_research(conn.cursor(), user_id, query, content_type, date_from, date_to,
+                                   limit, offset, self.archive_dir if include_archive else None)
+
+    def rebuild_search_index(self):
+        """Rebuild the full-text index from scratch"""
+        with self._connect(timeout=30) as conn:
+            if HAS_FTS5:
+                rebuild_search_index(conn.cursor())
+                conn.commit()
+
+    def get_usage_rollups(self, days=30):
+        """Usage per day/content type and top users over the last `days` days"""
+        with self._connect() as conn:
+            return usage_rollups(conn.cursor(), days)
+
+    def rebuild_usage_rollups(self):
+        """Recompute the usage rollups from scratch"""
+        with self._connect(timeout=30) as conn:
+            rebuild_usage_rollups(conn.cursor(), self.archive_dir)
+            conn.commit()
+
+    def archive_old_history(self, max_age_days=ARCHIVE_AFTER_DAYS, batch_size=500, pause=0.05):
+        """Move old history rows into the monthly archive databases"""
+        with self._connect(timeout=30) as conn:
+            return archive_old_history(conn, self.archive_dir, max_age_days, batch_size, pause)
+
+    def migrate_legacy_content(self, batch_size=200, pause=0.05):
+        """Move content embedded in history rows into the shared blob store.
+
+        Handles both plain TEXT rows and rows compressed in place. Each batch
+        is its own short transaction, with a pause in between, so live writers
+        are never locked out for long. Safe to interrupt and re-run.
+        Returns the number of rows converted.
+        """
+        converted = 0
+        last_id = 0
+        while True:
+            with self._connect(timeout=30) as conn:
+                c = conn.cursor()
+                c.execute("""
+                    SELECT id, content FROM research_history
+                    WHERE id > ? AND content_hash IS NULL
+                    ORDER BY id
+                    LIMIT ?
+                """, (last_id, batch_size))
+                rows = c.fetchall()
+                if not rows:
+                    return converted
+                for row_id, stored in rows:
+                    digest = acquire_blob(c, decompress_content(stored))
+                    c.execute("UPDATE research_history SET content = '', content_hash = ? WHERE id = ?",
+                              (digest, row_id))
+                conn.commit()
+            converted += len(rows)
+            last_id = rows[-1][0]
+            time.sleep(pause)
+
+    def collect_garbage_blobs(self, recount=False):
+        """Delete blobs no history row references any more.
+
+        With recount=True the reference counts are recomputed from research_history
+        first, repairing any drift. Returns the number of blobs removed.
+        """
+        with self._connect(timeout=30) as conn:
+            c = conn.cursor()
+            if recount:
+                c.execute("""
+                    UPDATE content_blobs SET ref_count =
+                        (SELECT COUNT(*) FROM research_history WHERE content_hash = content_blobs.hash)
+                """)
+            c.execute("DELETE FROM content_blobs WHERE ref_count <= 0")
+            removed = c.rowcount
+            conn.commit()
+            return removed
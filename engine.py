@@ -0,0 +1,260 @@
+"""Research generation engine shared by the Streamlit UI and the HTTP API.
+
+Runs the prompt templates from prompts.py and holds the retry and fallback
+logic, a TTL cache of generated content, the fair scheduler every Gemini call
+goes through and a rate limiter for those calls.
+Everything is process-wide, so every Streamlit session and API client in one
+server process shares the same cache and the same call budget. Nothing here imports Streamlit.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import parsing
+import prompts
+import quotas
+import scheduling
+
+MODEL_NAME = "gemini-1.5-flash"
+CONTENT_TYPES = ["questions", "literature", "future", "references", "abstract", "analysis"]
+CONTENT_TITLES = {
+    "questions": "Research Questions",
+    "literature": "Literature Review",
+    "future": "Future Research Directions",
+    "references": "APA References",
+    "abstract": "Academic Abstract",
+    "analysis": "Comprehensive Analysis"
+}
+MAX_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 1
+CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "1024"))
+# Gemini calls allowed per minute across the whole process, and how long a caller waits for one
+RATE_LIMIT_PER_MINUTE = int(os.getenv("GEMINI_RATE_LIMIT_PER_MINUTE", "60"))
+RATE_LIMIT_WAIT_SECONDS = float(os.getenv("GEMINI_RATE_LIMIT_WAIT_SECONDS", "10"))
+
+# Content types with json prompts, parsed into a numbered list for display and history
+STRUCTURED_TYPES = {"analysis": parsing.parse_subtopics}
+
+FALLBACK_TOPICS = [
+    "AI Ethics: Ethical implications of AI in decision-making",
+    "Quantum Computing: Advances in quantum algorithms",
+    "Climate Modeling: Improved climate change predictions",
+    "Bioinformatics: Genomic data analysis techniques",
+    "Renewable Energy: Next-generation solar cell technology"
+]
+FALLBACK_SUBTOPICS = parsing.numbered(f"Sample sub-topic {i}" for i in range(1, 6))
+
+# content is what to show; raw is the model output to store in history (for STRUCTURED_TYPES,
+# the parsed list rather than the JSON), None for a fallback.
+# fresh is True only when the model was called for this request (not a cache hit or fallback).
+# version is the version of the prompt template the section was generated with.
+Generation = namedtuple("Generation", "content raw fresh version")
+
+
+class RateLimitExceeded(Exception):
+    """No Gemini call slot became free within the wait time"""
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a per-entry TTL"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` calls per `per` seconds, in bursts of up to `rate`"""
+
+    def __init__(self, rate=RATE_LIMIT_PER_MINUTE, per=60.0):
+        self.rate = rate
+        self.per = per
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=RATE_LIMIT_WAIT_SECONDS):
+        """Take one call slot, waiting up to `timeout` seconds; False if none freed up"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.per)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) * self.per / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+cache = TTLCache()
+rate_limiter = RateLimiter()
+scheduler = scheduling.FairScheduler()
+# The host process sets a quotas.QuotaTracker for its database; None means no quotas
+quota_tracker = None
+_model = None
+_json_mode = False
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """The Gemini model, created on first use so the SDK import stays off the startup path"""
+    global _model, _json_mode
+    with _model_lock:
+        if _model is None:
+            import google.generativeai as genai
+
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            _model = genai.GenerativeModel(MODEL_NAME)
+            # JSON mode only exists in newer SDKs; otherwise the prompt alone asks for JSON
+            try:
+                genai.types.GenerationConfig(response_mime_type="application/json")
+                _json_mode = True
+            except TypeError:
+                _json_mode = False
+        return _model
+
+
+def call_model(prompt, json_output=False, max_output_tokens=None):
+    """One rate-limited Gemini call; returns the response text"""
+    if not rate_limiter.acquire():
+        raise RateLimitExceeded("Gemini rate limit reached, try again shortly")
+    model = get_model()
+    config = {}
+    if max_output_tokens:
+        config["max_output_tokens"] = max_output_tokens
+    if json_output and _json_mode:
+        config["response_mime_type"] = "application/json"
+    return model.generate_content(prompt, generation_config=config or None).text
+
+
+def run_prompt(template, user=None, priority=scheduling.INTERACTIVE, weight=1.0, **values):
+    """Render a registered template and call the model with its output settings.
+
+    Raises quotas.QuotaExceeded before calling when `user` is out of quota. The
+    call waits for a scheduler slot for `user`; if none frees up in time this
+    raises RateLimitExceeded, like a full rate limit does.
+    """
+    prompt = template.render(**values)
+    tracker = quota_tracker
+    if tracker:
+        tracker.check(user)
+    try:
+        with scheduler.slot(user, priority, cost=template.max_output_tokens, weight=weight):
+            try:
+                text = call_model(prompt, json_output=template.output_format == "json",
+                                  max_output_tokens=template.max_output_tokens)
+            except RateLimitExceeded:
+                raise  # the model was not called
+            except Exception:
+                if tracker:
+                    tracker.record(user, quotas.estimate_tokens(prompt))
+                raise
+            if tracker:
+                tracker.record(user, quotas.estimate_tokens(prompt) + quotas.estimate_tokens(text))
+            return text
+    except scheduling.QueueTimeout as e:
+        raise RateLimitExceeded(str(e))
+
+
+def _cache_key(*parts):
+    return tuple(" ".join(str(part).split()).lower() for part in parts)
+
+
+def get_trending_topics(use_cache=True, on_error=None, user=None, priority=scheduling.INTERACTIVE, weight=1.0):
+    """Five trending topics as "Topic: Description" strings; the fallback list if generation fails.
+
+    `on_error(attempt, error)` is called for every failed attempt. `user`, `priority`
+    and `weight` place the model call in the scheduler.
+    """
+    template = prompts.get("trending")
+    key = _cache_key("trending", template.version)
+    if use_cache:
+        topics = cache.get(key)
+        if topics is not None:
+            return list(topics)
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            topics = parsing.parse_topics(run_prompt(template, user, priority, weight))
+            cache.set(key, topics, template.cache_ttl)
+            return list(topics)
+        except (RateLimitExceeded, quotas.QuotaExceeded):
+            raise
+        except Exception as e:
+            if on_error:
+                on_error(attempt, e)
+            time.sleep(RETRY_DELAY_SECONDS)
+    return list(FALLBACK_TOPICS)
+
+
+def generate_research_content(topic, content_type, use_cache=True, on_error=None, user=None,
+                              priority=scheduling.INTERACTIVE, weight=1.0):
+    """Generate one research section for a topic and return a Generation.
+
+    Successful output is cached for the prompt template's TTL under its version,
+    so editing the template invalidates it. Pass use_cache=False to
+    force a new generation, e.g. for another round of subtopics. `on_error(attempt,
+    error)` is called for every failed attempt. `user`, `priority` and `weight` place
+    the model call in the scheduler. Raises RateLimitExceeded when no call slot is free
+    and quotas.QuotaExceeded when the user is out of quota.
+    """
+    if content_type not in CONTENT_TYPES:
+        raise ValueError(f"Unknown content type '{content_type}'")
+    template = prompts.get(content_type)
+    key = _cache_key("research", content_type, template.version, topic)
+    if use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            return Generation(cached[0], cached[1], False, template.version)
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            raw = run_prompt(template, user, priority, weight, topic=topic)
+            content = raw
+            if content_type in STRUCTURED_TYPES:
+                # A ParseError counts as a failed attempt, but only once local repair has failed too
+                content = raw = parsing.numbered(STRUCTURED_TYPES[content_type](raw))
+            cache.set(key, (content, raw), template.cache_ttl)
+            return Generation(content, raw, True, template.version)
+        except (RateLimitExceeded, quotas.QuotaExceeded):
+            raise
+        except Exception as e:
+            if on_error:
+                on_error(attempt, e)
+            time.sleep(RETRY_DELAY_SECONDS)
+    if content_type == "analysis":
+        return Generation(FALLBACK_SUBTOPICS, None, False, template.version)
+    return Generation(f"Could not generate {content_type} content. Please try again.", None, False,
+                      template.version)
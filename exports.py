@@ -0,0 +1,75 @@
+"""Bulk export of a user's research history as a ZIP of markdown files"""
+import glob
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import zipfile
+
+from database import archive_dir_for, history_fingerprint, iter_research_export
+
+EXPORT_DIR = os.getenv("EXPORT_DIR") or os.path.join(tempfile.gettempdir(), "scholarmind_exports")
+
+
+def slugify(text, max_length=60):
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_")
+    return slug[:max_length] or "untitled"
+
+
+def _export_name(user_id, content_type, include_archive):
+    scope = (content_type or "all") + ("-archive" if include_archive else "-recent")
+    return f"history_{user_id}_{scope}"
+
+
+def _write_zip(f, entries):
+    manifest = []
+    with zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as archive:
+        for row_id, topic, row_type, created_at, content, month in entries:
+            filename = f"{created_at[:10]}_{row_id}_{slugify(topic)}_{row_type}.md"
+            archive.writestr(filename, content)
+            manifest.append({
+                "id": row_id,
+                "topic": topic,
+                "content_type": row_type,
+                "created_at": created_at,
+                "archived": month is not None,
+                "file": filename
+            })
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+
+
+def build_history_export(db_name, user_id, content_type=None, include_archive=False):
+    """Return the path of a ZIP with every matching history entry plus a manifest.json.
+
+    Reads come from the live database, so the export includes what the user just
+    saved. The archive is written entry by entry from short paged reads, so memory
+    stays flat and writers are not held up for the whole export. It is
+    cached on disk under a fingerprint of the user's history and only rebuilt
+    once that history changes.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    conn = sqlite3.connect(db_name)
+    try:
+        name = _export_name(user_id, content_type, include_archive)
+        path = os.path.join(EXPORT_DIR, f"{name}_{history_fingerprint(conn.cursor(), user_id, content_type)}.zip")
+        if os.path.exists(path):
+            return path
+
+        archive_dir = archive_dir_for(db_name) if include_archive else None
+        fd, tmp_path = tempfile.mkstemp(dir=EXPORT_DIR, suffix=".zip.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                _write_zip(f, iter_research_export(conn, user_id, content_type, archive_dir))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    finally:
+        conn.close()
+
+    # Older exports of the same scope are stale now
+    for stale in glob.glob(os.path.join(EXPORT_DIR, f"{name}_*.zip")):
+        if stale != path:
+            os.remove(stale)
+    return path
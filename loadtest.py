@@ -0,0 +1,300 @@
+"""Concurrent-session load test for the SQLite access layer.
+
+Simulates N Streamlit sessions, each a thread like in the real server, running a
+weighted mix of the real DatabaseManager operations against a scratch copy of
+the database. Every combination of the given locking modes, journal modes,
+pooling modes and batch sizes is run and reported side by side.
+
+Locking modes:
+- app: connections wait on locks inside SQLite with the app's busy timeout
+  (APP_BUSY_TIMEOUT_SECONDS, what app.py's sqlite3.connect calls get) and saves
+  go through the app's save path, store_research_once. What SQLite spends waiting
+  can't be seen from Python, so it is only in the latencies; "busy" counts the
+  operations that still hit SQLITE_BUSY when the timeout ran out.
+- harness: connections fail fast (timeout=0) and the harness retries with its own
+  backoff, so every SQLITE_BUSY is counted and "wait s" is the whole interval
+  from an operation's first SQLITE_BUSY until it got through.
+
+Usage:
+    python loadtest.py --sessions 20 --duration 15 --locking app,harness --journal delete,wal --pooling none,thread
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from database import DatabaseManager
+from passwords import hash_password
+
+DEFAULT_MIX = "login=5,save=15,list=45,read=30,admin=5"
+LOAD_PASSWORD = "loadtest"
+# Give up on an operation that has been waiting for locks this long
+LOCK_DEADLINE_SECONDS = 5.0
+# sqlite3.connect's default busy timeout, which every connection in app.py uses
+APP_BUSY_TIMEOUT_SECONDS = 5.0
+# Stands in for a prompt template version on saves in app mode
+LOAD_PROMPT_VERSION = "loadtest"
+WORDS = ("model data learning network analysis method results study framework approach "
+         "system performance evaluation research quantum climate genomic neural energy").split()
+
+
+class BenchDatabase(DatabaseManager):
+    """DatabaseManager whose connections wait on locks like the app's or fail fast, optionally pooled per thread"""
+
+    def __init__(self, db_name, pooling="none", locking="harness"):
+        self.pooling = pooling
+        self.locking = locking
+        self._local = threading.local()
+        super().__init__(db_name)
+
+    def _connect(self, timeout=5.0):
+        # In harness mode timeout=0 surfaces every SQLITE_BUSY so the harness can count and time the waits
+        timeout = APP_BUSY_TIMEOUT_SECONDS if self.locking == "app" else 0
+        if self.pooling == "thread":
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = sqlite3.connect(self.db_name, timeout=timeout)
+            return conn
+        return sqlite3.connect(self.db_name, timeout=timeout)
+
+
+def _is_busy(error):
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+class Session:
+    def __init__(self, db, user, mix, batch_size, seed):
+        self.db = db
+        self.user = user
+        self.ops, self.weights = zip(*mix.items())
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.pending = []
+        self.history_ids = []
+        self.latencies = {}
+        self.busy_retries = 0
+        self.lock_wait = 0.0
+        self.failures = 0
+
+    def _call(self, name, fn, *args):
+        start = time.perf_counter()
+        first_busy = None
+        delay = 0.001
+        while True:
+            try:
+                result = fn(*args)
+                break
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e):
+                    raise
+                self.busy_retries += 1
+                # SQLite already waited out the app's busy timeout
+                if self.db.locking == "app":
+                    self.failures += 1
+                    return None
+                now = time.perf_counter()
+                if first_busy is None:
+                    first_busy = now
+                if now - start > LOCK_DEADLINE_SECONDS:
+                    self.lock_wait += now - first_busy
+                    self.failures += 1
+                    return None
+                time.sleep(delay)
+                delay = min(delay * 2, 0.05)
+        end = time.perf_counter()
+        if first_busy is not None:
+            self.lock_wait += end - first_busy
+        self.latencies.setdefault(name, []).append(end - start)
+        return result
+
+    def _content(self):
+        words = self.rng.choices(WORDS, k=self.rng.randint(300, 700))
+        return "# Generated\n\n" + " ".join(words)
+
+    def step(self):
+        op = self.rng.choices(self.ops, self.weights)[0]
+        if op == "login":
+            self._call("login", self.db.authenticate_user, self.user["username"], LOAD_PASSWORD)
+        elif op == "save":
+            item = (self.user["id"], f"topic {self.rng.randint(1, 50)}", "abstract", self._content())
+            if self.batch_size <= 1 and self.db.locking == "app":
+                # A freshly generated section, saved the way the app saves it
+                history_id = self._call("save", self.db.save_generation, *item, LOAD_PROMPT_VERSION, True)
+                if history_id:
+                    self.history_ids.append(history_id)
+            elif self.batch_size <= 1:
+                history_id = self._call("save", self.db.save_research, *item)
+                if history_id:
+                    self.history_ids.append(history_id)
+            else:
+                self.pending.append(item)
+                if len(self.pending) >= self.batch_size:
+                    self.flush()
+        elif op == "list":
+            rows = self._call("list", self.db.get_research_history, self.user["id"], 20)
+            if rows:
+                self.history_ids = [row[0] for row in rows]
+        elif op == "read":
+            if self.history_ids:
+                self._call("read", self.db.get_research_content, self.rng.choice(self.history_ids))
+        elif op == "admin":
+            self._call("admin", self.db.list_users, "", None, None, 25)
+
+    def flush(self):
+        if self.pending:
+            ids = self._call("save_batch", self.db.save_research_batch, self.pending)
+            self.history_ids.extend(ids or [])
+            self.pending = []
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def prepare_database(path, source, sessions, journal, seed_history):
+    if source:
+        shutil.copy(source, path)
+    conn = sqlite3.connect(path)
+    conn.execute(f"PRAGMA journal_mode={journal}")
+    conn.close()
+
+    db = DatabaseManager(path)
+    password_hash = hash_password(LOAD_PASSWORD)
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT OR IGNORE INTO users (username, password_hash, role) VALUES (?, ?, 'user')",
+                     [(f"load_user_{i}", password_hash) for i in range(sessions)])
+    conn.commit()
+    users = [{"id": row[0], "username": row[1]} for row in conn.execute(
+        "SELECT id, username FROM users WHERE username LIKE 'load\\_user\\_%' ESCAPE '\\' ORDER BY id")]
+    conn.close()
+
+    rng = random.Random(0)
+    db.save_research_batch([(user["id"], f"topic {n}", "abstract",
+                             " ".join(rng.choices(WORDS, k=400)))
+                            for user in users[:sessions] for n in range(seed_history)])
+    return users[:sessions]
+
+
+def run_config(args, locking, journal, pooling, batch_size, mix):
+    workdir = tempfile.mkdtemp(prefix="scholarmind_load_")
+    try:
+        path = os.path.join(workdir, "load.db")
+        users = prepare_database(path, args.db, args.sessions, journal, args.seed_history)
+        db = BenchDatabase(path, pooling, locking)
+        sessions = [Session(db, user, mix, batch_size, seed=args.seed * 1000 + i) for i, user in enumerate(users)]
+
+        barrier = threading.Barrier(len(sessions) + 1)
+        deadline = [0.0]
+
+        def worker(session):
+            barrier.wait()
+            while time.perf_counter() < deadline[0]:
+                session.step()
+            session.flush()
+
+        threads = [threading.Thread(target=worker, args=(session,)) for session in sessions]
+        for thread in threads:
+            thread.start()
+        start = time.perf_counter()
+        deadline[0] = start + args.duration
+        barrier.wait()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    per_op = {}
+    for session in sessions:
+        for name, values in session.latencies.items():
+            per_op.setdefault(name, []).extend(values)
+    all_latencies = sorted(itertools.chain.from_iterable(per_op.values()))
+    return {
+        "locking": locking,
+        "journal": journal,
+        "pooling": pooling,
+        "batch": batch_size,
+        "ops": len(all_latencies),
+        "ops_per_sec": len(all_latencies) / elapsed,
+        "p50_ms": _percentile(all_latencies, 50) * 1000,
+        "p95_ms": _percentile(all_latencies, 95) * 1000,
+        "p99_ms": _percentile(all_latencies, 99) * 1000,
+        "busy_retries": sum(s.busy_retries for s in sessions),
+        # Waits inside SQLite's busy handler are not visible in app mode
+        "lock_wait_s": sum(s.lock_wait for s in sessions) if locking == "harness" else None,
+        "failures": sum(s.failures for s in sessions),
+        "per_op": {name: {"count": len(values),
+                          "p50_ms": _percentile(sorted(values), 50) * 1000,
+                          "p95_ms": _percentile(sorted(values), 95) * 1000}
+                   for name, values in sorted(per_op.items())}
+    }
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, weight = part.split("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def print_report(results):
+    header = (f"{'locking':<8} {'journal':<8} {'pooling':<7} {'batch':>5} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'busy':>7} {'wait s':>8} {'failed':>6}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        wait = "-" if r["lock_wait_s"] is None else f"{r['lock_wait_s']:.2f}"
+        print(f"{r['locking']:<8} {r['journal']:<8} {r['pooling']:<7} {r['batch']:>5} {r['ops_per_sec']:>9.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['busy_retries']:>7} {wait:>8} "
+              f"{r['failures']:>6}")
+    print()
+    for r in results:
+        ops = ", ".join(f"{name} {stats['count']}x p50 {stats['p50_ms']:.1f}/p95 {stats['p95_ms']:.1f} ms"
+                        for name, stats in r["per_op"].items())
+        print(f"[{r['locking']}/{r['journal']}/{r['pooling']}/batch {r['batch']}] {ops}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session SQLite load test")
+    parser.add_argument("--db", help="Database to copy as the starting point (default: a fresh one)")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per configuration")
+    parser.add_argument("--locking", default="app,harness",
+                        help="Comma-separated: app (busy timeout and save path as in app.py), harness (fail fast and retry)")
+    parser.add_argument("--journal", default="delete,wal", help="Comma-separated journal modes")
+    parser.add_argument("--pooling", default="none,thread", help="Comma-separated: none, thread")
+    parser.add_argument("--batch", default="1", help="Comma-separated save batch sizes")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Operation weights, e.g. " + DEFAULT_MIX)
+    parser.add_argument("--seed-history", type=int, default=20, help="History rows per session user")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    results = []
+    for locking, journal, pooling, batch in itertools.product(args.locking.split(","), args.journal.split(","),
+                                                              args.pooling.split(","),
+                                                              [int(b) for b in args.batch.split(",")]):
+        print(f"Running locking={locking} journal={journal} pooling={pooling} batch={batch} ...", flush=True)
+        results.append(run_config(args, locking, journal, pooling, batch, mix))
+
+    print()
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Maintenance commands for the ScholarMind database.
+
+Usage:
+    python manage.py migrate-content [--db scholarmind.db] [--batch-size 200]
+    python manage.py gc-blobs [--recount]
+    python manage.py rebuild-search-index
+    python manage.py rebuild-rollups
+    python manage.py archive-history [--older-than-days 180]
+    python manage.py snapshot
+    python manage.py purge-sessions
+    python manage.py calibrate-kdf [--scheme argon2] [--target-ms 250]
+    python manage.py bench-kdf [--schemes pbkdf2_sha256,bcrypt,argon2] [--target-ms 250]
+"""
+import argparse
+
+from database import ARCHIVE_AFTER_DAYS, DatabaseManager
+from passwords import (PASSWORD_SCHEME, SCHEMES, available_schemes, benchmark, calibrate, measure_verify,
+                       scheme_settings, settings_env)
+from sessions import purge_sessions
+from snapshot import SNAPSHOT_PATH, refresh_snapshot
+
+
+def migrate_content(args):
+    db = DatabaseManager(args.db)
+    converted = db.migrate_legacy_content(batch_size=args.batch_size, pause=args.pause)
+    print(f"Moved {converted} research history rows into the blob store")
+
+
+def gc_blobs(args):
+    db = DatabaseManager(args.db)
+    removed = db.collect_garbage_blobs(recount=args.recount)
+    print(f"Removed {removed} unreferenced content blobs")
+
+
+def rebuild_search_index(args):
+    db = DatabaseManager(args.db)
+    db.rebuild_search_index()
+    print("Rebuilt the full-text search index")
+
+
+def rebuild_rollups(args):
+    db = DatabaseManager(args.db)
+    db.rebuild_usage_rollups()
+    print("Rebuilt the usage rollup tables")
+
+
+def archive_history(args):
+    db = DatabaseManager(args.db)
+    archived = db.archive_old_history(max_age_days=args.older_than_days, batch_size=args.batch_size,
+                                      pause=args.pause)
+    print(f"Archived {archived} research history rows into {db.archive_dir}")
+
+
+def snapshot(args):
+    refresh_snapshot(args.db, SNAPSHOT_PATH)
+    print(f"Wrote analytics snapshot to {SNAPSHOT_PATH}")
+
+
+def purge_expired_sessions(args):
+    removed = purge_sessions(args.db)
+    print(f"Deleted {removed} expired or revoked login sessions")
+
+
+def calibrate_kdf(args):
+    if args.scheme not in available_schemes():
+        raise SystemExit(f"No working passlib backend for {args.scheme} is installed")
+    settings = calibrate(args.scheme, args.target_ms / 1000, memory_kib=args.memory_kib)
+    elapsed = measure_verify(args.scheme, settings)
+    print(f"{args.scheme} verify takes {elapsed * 1000:.0f} ms with {settings}. Add to .env:")
+    print("\n".join(settings_env(args.scheme, settings)))
+
+
+def bench_kdf(args):
+    schemes = args.schemes.split(",") if args.schemes else available_schemes()
+    header = f"{'scheme':<14} {'verify ms':>9} {'1 core/s':>9} {'total/s':>9} {'per core/s':>10}  settings"
+    print(header)
+    print("-" * len(header))
+    for scheme in schemes:
+        if scheme not in available_schemes():
+            print(f"{scheme:<14} skipped: unsupported or no working passlib backend installed")
+            continue
+        # Compare at equal latency when a target is given, otherwise at the configured settings
+        settings = calibrate(scheme, args.target_ms / 1000) if args.target_ms else scheme_settings(scheme)
+        r = benchmark(scheme, settings, duration=args.duration, workers=args.workers)
+        print(f"{scheme:<14} {r['verify_ms']:>9.1f} {r['single_core']:>9.1f} {r['total']:>9.1f} "
+              f"{r['per_core']:>10.1f}  {settings or 'passlib defaults'}", flush=True)
+    print(f"Total and per core are with {args.workers or 'all'} worker processes verifying at once")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ScholarMind maintenance commands")
+    parser.add_argument("--db", default="scholarmind.db", help="Path to the SQLite database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cmd = commands.add_parser("migrate-content", help="Move legacy inline research content into compressed blobs")
+    cmd.add_argument("--batch-size", type=int, default=200)
+    cmd.add_argument("--pause", type=float, default=0.05, help="Seconds to sleep between batches")
+    cmd.set_defaults(func=migrate_content)
+
+    cmd = commands.add_parser("gc-blobs", help="Delete content blobs no history row references")
+    cmd.add_argument("--recount", action="store_true", help="Recompute reference counts first")
+    cmd.set_defaults(func=gc_blobs)
+
+    cmd = commands.add_parser("rebuild-search-index", help="Repopulate the full-text search index")
+    cmd.set_defaults(func=rebuild_search_index)
+
+    cmd = commands.add_parser("rebuild-rollups", help="Recompute the admin analytics usage rollups")
+    cmd.set_defaults(func=rebuild_rollups)
+
+    cmd = commands.add_parser("archive-history", help="Move old research history into monthly archive files")
+    cmd.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    cmd.add_argument("--batch-size", type=int, default=500)
+    cmd.add_argument("--pause", type=float, default=0.05, help="Seconds to sleep between batches")
+    cmd.set_defaults(func=archive_history)
+
+    cmd = commands.add_parser("snapshot", help="Refresh the read-only analytics snapshot now")
+    cmd.set_defaults(func=snapshot)
+
+    cmd = commands.add_parser("purge-sessions", help="Delete expired and revoked login sessions")
+    cmd.set_defaults(func=purge_expired_sessions)
+
+    cmd = commands.add_parser("calibrate-kdf", help="Pick password hash settings for a target verify latency")
+    cmd.add_argument("--scheme", choices=SCHEMES, default=PASSWORD_SCHEME)
+    cmd.add_argument("--target-ms", type=float, default=250.0)
+    cmd.add_argument("--memory-kib", type=int, default=65536, help="argon2 memory to start from")
+    cmd.set_defaults(func=calibrate_kdf)
+
+    cmd = commands.add_parser("bench-kdf", help="Measure login throughput per password hash scheme")
+    cmd.add_argument("--schemes", help="Comma-separated schemes (default: all installed)")
+    cmd.add_argument("--target-ms", type=float, help="Calibrate every scheme to this verify latency first")
+    cmd.add_argument("--duration", type=float, default=3.0, help="Seconds per measurement")
+    cmd.add_argument("--workers", type=int, help="Parallel worker processes (default: CPU count)")
+    cmd.set_defaults(func=bench_kdf)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Structured parsing of model output for trending topics and subtopics.
+
+The prompts ask Gemini for JSON matching TOPICS_SCHEMA / SUBTOPICS_SCHEMA (the
+installed SDK has no response schema option, so the schema goes in the prompt,
+and JSON mode is requested where the SDK supports it). Output is parsed in
+three steps, stopping at the first that yields a valid result:
+
+1. strict: the whole text is JSON of the expected shape
+2. repaired: JSON after local fixes (code fences, surrounding prose, smart
+   quotes, trailing commas, a bare list instead of an object)
+3. list: a numbered or bulleted list, the format the prompts used to ask for
+
+Only when all three fail does the caller spend another model call. Per-kind
+counts of each outcome are kept in memory for the admin panel.
+"""
+import json
+import re
+import threading
+
+TOPIC_COUNT = 5
+SUBTOPIC_COUNT = 5
+MAX_ITEM_CHARS = 300
+
+TOPICS_SCHEMA = {
+    "type": "object",
+    "properties": {"topics": {"type": "array", "items": {
+        "type": "object",
+        "properties": {"topic": {"type": "string"}, "description": {"type": "string"}},
+        "required": ["topic", "description"]
+    }}},
+    "required": ["topics"]
+}
+SUBTOPICS_SCHEMA = {
+    "type": "object",
+    "properties": {"subtopics": {"type": "array", "items": {"type": "string"}}},
+    "required": ["subtopics"]
+}
+
+OUTCOMES = ("strict", "repaired", "list", "failed")
+LIST_ITEM = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s+(.*\S)")
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "„": '"', "‘": "'", "’": "'"})
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class ParseError(ValueError):
+    """Model output could not be turned into the expected structure"""
+
+
+def json_instructions(schema):
+    """Prompt suffix asking for JSON that matches `schema`"""
+    return ("Respond with JSON only, no markdown and no commentary, matching this JSON schema:\n"
+            + json.dumps(schema))
+
+
+def _record(kind, outcome):
+    with _stats_lock:
+        counts = _stats.setdefault(kind, dict.fromkeys(OUTCOMES, 0))
+        counts[outcome] += 1
+
+
+def stats():
+    """{kind: {outcome: count}} since the process started"""
+    with _stats_lock:
+        return {kind: dict(counts) for kind, counts in _stats.items()}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _clean(text):
+    """One line of plain text: markdown emphasis, numbering and wrapping quotes removed"""
+    text = re.sub(r"\*{1,3}|`+|\b_{1,2}|_{1,2}\b", "", str(text))
+    text = LIST_ITEM.sub(r"\1", text)
+    return " ".join(text.split()).strip(" \"'")
+
+
+def _repair(text):
+    text = text.translate(SMART_QUOTES).strip()
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.S)
+    if fenced:
+        text = fenced.group(1).strip()
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if starts:
+        start = min(starts)
+        end = text.rfind("}" if text[start] == "{" else "]")
+        text = text[start:end + 1]
+    return re.sub(r",\s*([}\]])", r"\1", text)
+
+
+def _items(data, field):
+    """The list under `field`, also accepting a bare list or the list under the only key"""
+    if isinstance(data, dict):
+        if field in data:
+            data = data[field]
+        elif len(data) == 1:
+            data = next(iter(data.values()))
+    if not isinstance(data, list):
+        raise ParseError(f"expected a list of {field}")
+    return data
+
+
+def _validated(items, count, label):
+    seen, result = set(), []
+    for item in items:
+        if not item or len(item) > MAX_ITEM_CHARS or item.lower() in seen:
+            continue
+        seen.add(item.lower())
+        result.append(item)
+    if len(result) < count:
+        raise ParseError(f"expected {count} {label}, got {len(result)} usable")
+    return result[:count]
+
+
+def _topic(item):
+    if isinstance(item, dict):
+        topic, description = _clean(item.get("topic", "")), _clean(item.get("description", ""))
+        if not topic or not description:
+            raise ParseError("topic entries need a topic and a description")
+        return f"{topic}: {description}"
+    if isinstance(item, str) and ":" in item:
+        return _clean(item)
+    raise ParseError("topic entries must be objects with a topic and a description")
+
+
+def _subtopic(item):
+    if not isinstance(item, str):
+        raise ParseError("subtopics must be strings")
+    return _clean(item)
+
+
+def _parse(text, kind, field, convert, count, list_items):
+    text = text or ""
+    for outcome, source in (("strict", text.strip()), ("repaired", _repair(text))):
+        try:
+            data = json.loads(source)
+            result = _validated([convert(item) for item in _items(data, field)], count, field)
+        except (ValueError, TypeError):
+            continue
+        _record(kind, outcome)
+        return result
+    try:
+        result = _validated(list_items(text), count, field)
+    except ParseError:
+        _record(kind, "failed")
+        raise
+    _record(kind, "list")
+    return result
+
+
+def _list_lines(text):
+    return [match.group(1) for match in map(LIST_ITEM.match, text.splitlines()) if match]
+
+
+def parse_topics(text, count=TOPIC_COUNT):
+    """`count` "Topic: Description" strings from model output; raises ParseError"""
+    def list_items(text):
+        lines = [_clean(line) for line in _list_lines(text) or text.splitlines()]
+        # "Topic: Description", possibly with a "Topic:" label in front
+        lines = [re.sub(r"^topic\s*:\s*", "", line, flags=re.I) for line in lines]
+        return [line for line in lines if ": " in line]
+
+    return _parse(text, "trending", "topics", _topic, count, list_items)
+
+
+def parse_subtopics(text, count=SUBTOPIC_COUNT):
+    """`count` subtopic strings from model output; raises ParseError"""
+    return _parse(text, "subtopics", "subtopics", _subtopic, count,
+                  lambda text: [_clean(line) for line in _list_lines(text)])
+
+
+def numbered(items):
+    """Items as the "1. item" markdown list the UI shows and stores"""
+    return "\n".join(f"{i}. {item}" for i, item in enumerate(items, start=1))
+
+
+def unnumbered(text):
+    """The items of a list made by `numbered` (not counted in the parse stats)"""
+    return [_clean(line) for line in _list_lines(text)]
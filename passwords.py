@@ -0,0 +1,256 @@
+"""Password hashing helpers.
+
+Hashing and verification are pure CPU work that holds the GIL, so they run in a
+bounded process pool instead of the Streamlit script thread. A burst of logins
+queues up in the pool (up to HASH_QUEUE_SIZE jobs) rather than stalling every
+other session's rerun, and callers give up with TimeoutError after
+HASH_TIMEOUT_SECONDS.
+
+New hashes use PASSWORD_SCHEME with the cost settings from the environment
+(see SCHEME_SETTINGS); `calibrate` picks those settings for a target verify
+latency on the current machine and `benchmark` measures logins/sec per core.
+"""
+import multiprocessing
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+# Every scheme a stored hash may use; hashes made with anything but PASSWORD_SCHEME,
+# or with other cost settings, are upgraded on the next login
+SCHEMES = ("pbkdf2_sha256", "bcrypt", "argon2")
+PASSWORD_SCHEME = os.getenv("PASSWORD_SCHEME", "pbkdf2_sha256")
+# Cost settings per scheme and the environment variables that set them; unset ones use passlib's defaults
+SCHEME_SETTINGS = {
+    "pbkdf2_sha256": {"rounds": "PASSWORD_ROUNDS"},
+    "bcrypt": {"rounds": "BCRYPT_ROUNDS"},
+    "argon2": {"time_cost": "ARGON2_TIME_COST", "memory_cost": "ARGON2_MEMORY_COST",
+               "parallelism": "ARGON2_PARALLELISM"}
+}
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 2)))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", "64"))
+HASH_TIMEOUT_SECONDS = float(os.getenv("HASH_TIMEOUT_SECONDS", "10"))
+# Processes hash_passwords uses for a bulk import, leaving the other cores to the web server
+HASH_BULK_WORKERS = int(os.getenv("HASH_BULK_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Workers are started from a fork server, not forked from the web process: that one runs
+# tornado, the API server and background threads, and a fork could inherit a lock one of them holds
+_MP_CONTEXT = multiprocessing.get_context("forkserver")
+# The fork server needs only this module, not a re-import of whatever script started the process
+_MP_CONTEXT.set_forkserver_preload([__name__])
+# argon2 memory (KiB) tried first when calibrating, and the least it will go down to
+ARGON2_CALIBRATION_MEMORY_KIB = 65536
+ARGON2_MIN_MEMORY_KIB = 8192
+BENCH_PASSWORD = "correct horse battery staple"
+
+_pool = None
+_pool_lock = threading.Lock()
+_queue_slots = threading.BoundedSemaphore(HASH_QUEUE_SIZE)
+
+
+def scheme_settings(scheme):
+    """Cost settings for a scheme as configured in the environment"""
+    return {key: int(os.environ[var]) for key, var in SCHEME_SETTINGS[scheme].items() if os.getenv(var)}
+
+
+def make_context(scheme, settings=None):
+    """CryptContext that hashes with `scheme` and flags every other scheme for upgrade"""
+    # passlib is imported here, not at module level: the web app only needs it inside the hashing pool
+    from passlib.context import CryptContext
+
+    options = {f"{scheme}__{key}": value for key, value in (settings or {}).items()}
+    return CryptContext(schemes=[scheme] + [s for s in SCHEMES if s != scheme], default=scheme,
+                        deprecated="auto", **options)
+
+
+@lru_cache(maxsize=1)
+def _context():
+    return make_context(PASSWORD_SCHEME, scheme_settings(PASSWORD_SCHEME))
+
+
+# These run inside the worker processes
+def _hash(password):
+    return _context().hash(password)
+
+
+def _verify_and_update(password, password_hash):
+    return _context().verify_and_update(password, password_hash)
+
+
+def _load_context():
+    # Worker initializer: import passlib and build the context before the first job arrives
+    try:
+        _context()
+    except Exception:
+        pass  # a bad configuration is reported by the first hash instead of breaking the pool
+
+
+def warm_pool():
+    """Start every hashing worker now, so the first logins after a restart do not pay for it"""
+    pool = _get_pool()
+    for future in [pool.submit(int) for _ in range(HASH_WORKERS)]:
+        future.result(timeout=HASH_TIMEOUT_SECONDS)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=_MP_CONTEXT,
+                                        initializer=_load_context)
+        return _pool
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(pool, fn, *args):
+    if not _queue_slots.acquire(timeout=HASH_TIMEOUT_SECONDS):
+        raise TimeoutError("Password hashing queue is full")
+    try:
+        future = pool.submit(fn, *args)
+    except BaseException:
+        _queue_slots.release()
+        raise
+    future.add_done_callback(lambda _: _queue_slots.release())
+    return future
+
+
+def _run(fn, *args):
+    pool = _get_pool()
+    try:
+        return _submit(pool, fn, *args).result(timeout=HASH_TIMEOUT_SECONDS)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed), which breaks the whole pool for good; start a new one and retry once
+        _discard_pool(pool)
+        return _submit(_get_pool(), fn, *args).result(timeout=HASH_TIMEOUT_SECONDS)
+
+
+def hash_password(password):
+    """Hash a password with the configured parameters"""
+    return _run(_hash, password)
+
+
+def verify_password(password, password_hash):
+    """Check a password; returns (valid, new_hash).
+
+    new_hash is set when the stored hash was made with different parameters than
+    the configured ones and should replace it.
+    """
+    return _run(_verify_and_update, password, password_hash)
+
+
+def hash_passwords(passwords, progress=None, chunksize=4):
+    """Hash many passwords across HASH_BULK_WORKERS processes, preserving order.
+
+    Uses its own pool so a bulk import never fills the login queue.
+    `progress(done, total)` is called as results come back.
+    """
+    hashes = []
+    with ProcessPoolExecutor(max_workers=HASH_BULK_WORKERS, mp_context=_MP_CONTEXT) as pool:
+        for password_hash in pool.map(_hash, passwords, chunksize=chunksize):
+            hashes.append(password_hash)
+            if progress:
+                progress(len(hashes), len(passwords))
+    return hashes
+
+
+def available_schemes():
+    """Schemes whose passlib backend is installed and working here"""
+    from passlib.registry import get_crypt_handler
+
+    available = []
+    for scheme in SCHEMES:
+        handler = get_crypt_handler(scheme)
+        try:
+            if not hasattr(handler, "has_backend") or handler.has_backend():
+                available.append(scheme)
+        except Exception:  # e.g. bcrypt>=4.1 breaks passlib 1.7.4's backend check
+            pass
+    return available
+
+
+def measure_verify(scheme, settings, samples=5):
+    """Median seconds one verify takes on this machine"""
+    context = make_context(scheme, settings)
+    password_hash = context.hash(BENCH_PASSWORD)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.verify(BENCH_PASSWORD, password_hash)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def calibrate(scheme, target_seconds, samples=5, memory_kib=ARGON2_CALIBRATION_MEMORY_KIB):
+    """Strongest settings for `scheme` whose verify takes about target_seconds here"""
+    if scheme == "pbkdf2_sha256":
+        # Cost is linear in rounds; scale from a probe, then correct once at the estimate
+        rounds = 10000
+        for _ in range(2):
+            rounds = max(1000, int(rounds * target_seconds / measure_verify(scheme, {"rounds": rounds}, samples)))
+        return {"rounds": rounds}
+    if scheme == "bcrypt":
+        # Cost is a log2 work factor, so each step doubles the time
+        rounds = 4
+        while rounds < 31 and measure_verify(scheme, {"rounds": rounds + 1}, samples) <= target_seconds:
+            rounds += 1
+        return {"rounds": rounds}
+    if scheme == "argon2":
+        # Keep as much memory as fits in one pass, then spend the rest of the budget on passes.
+        # parallelism=1 because concurrent logins already occupy the other cores.
+        settings = {"time_cost": 1, "memory_cost": memory_kib, "parallelism": 1}
+        elapsed = measure_verify(scheme, settings, samples)
+        while elapsed > target_seconds and settings["memory_cost"] // 2 >= ARGON2_MIN_MEMORY_KIB:
+            settings["memory_cost"] //= 2
+            elapsed = measure_verify(scheme, settings, samples)
+        settings["time_cost"] = max(1, int(target_seconds / elapsed))
+        while settings["time_cost"] > 1 and measure_verify(scheme, settings, samples) > target_seconds:
+            settings["time_cost"] -= 1
+        return settings
+    raise ValueError(f"Unknown password scheme '{scheme}'")
+
+
+def settings_env(scheme, settings):
+    """.env lines that make `scheme` with `settings` the configured hashing"""
+    lines = [f"PASSWORD_SCHEME={scheme}"]
+    lines += [f"{SCHEME_SETTINGS[scheme][key]}={value}" for key, value in settings.items()]
+    return lines
+
+
+def _verify_loop(scheme, settings, password_hash, duration):
+    context = make_context(scheme, settings)
+    count = 0
+    start = time.perf_counter()
+    while True:
+        context.verify(BENCH_PASSWORD, password_hash)
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return count / elapsed
+
+
+def benchmark(scheme, settings, duration=3.0, workers=None):
+    """Logins/sec for `scheme` in one process and across `workers` processes at once"""
+    workers = workers or os.cpu_count() or 1
+    password_hash = make_context(scheme, settings).hash(BENCH_PASSWORD)
+    single = _verify_loop(scheme, settings, password_hash, duration)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rates = list(pool.map(_verify_loop, [scheme] * workers, [settings] * workers,
+                              [password_hash] * workers, [duration] * workers))
+    return {
+        "scheme": scheme,
+        "settings": settings,
+        "verify_ms": 1000 / single,
+        "single_core": single,
+        "workers": workers,
+        "total": sum(rates),
+        "per_core": sum(rates) / workers
+    }
@@ -0,0 +1,84 @@
+"""Registry of the named, versioned prompt templates used by the engine.
+
+Every template declares its output format ("markdown" or "json", with the
+schema appended to the prompt for json), an output token budget and a cache
+TTL. Its version is a short hash of everything that shapes the model output
+(wording, format, schema, budget), computed once when this module is loaded.
+The engine puts the version in its cache keys, so editing one template makes
+exactly that template's cached outputs unreachable and leaves the rest alone;
+changing only a TTL keeps the version.
+"""
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+import parsing
+
+CACHE_TTL_SECONDS = int(os.getenv("GENERATION_CACHE_TTL_SECONDS", "3600"))
+TRENDING_CACHE_TTL_SECONDS = int(os.getenv("TRENDING_CACHE_TTL_SECONDS", "900"))
+OUTPUT_FORMATS = ("markdown", "json")
+
+
+class PromptTemplate(namedtuple("PromptTemplate", "name text output_format schema max_output_tokens cache_ttl "
+                                                  "version")):
+    __slots__ = ()
+
+    def render(self, **values):
+        """The prompt text with `values` filled in, plus the JSON instructions for json templates"""
+        prompt = self.text.format(**values)
+        if self.output_format == "json":
+            prompt += "\n" + parsing.json_instructions(self.schema)
+        return prompt
+
+
+PROMPTS = {}
+
+
+def register(name, text, output_format="markdown", schema=None, max_output_tokens=1024,
+             cache_ttl=CACHE_TTL_SECONDS):
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}'")
+    if (output_format == "json") != (schema is not None):
+        raise ValueError(f"Prompt '{name}' needs a schema exactly when its output format is json")
+    fingerprint = json.dumps([text, output_format, schema, max_output_tokens], sort_keys=True)
+    version = hashlib.sha256(fingerprint.encode()).hexdigest()[:12]
+    PROMPTS[name] = PromptTemplate(name, text, output_format, schema, max_output_tokens, cache_ttl, version)
+    return PROMPTS[name]
+
+
+def get(name):
+    try:
+        return PROMPTS[name]
+    except KeyError:
+        raise ValueError(f"Unknown prompt '{name}'") from None
+
+
+register("trending", """Generate exactly 5 trending academic research topics with brief descriptions
+    (max 20 words each).""",
+         output_format="json", schema=parsing.TOPICS_SCHEMA, max_output_tokens=512,
+         cache_ttl=TRENDING_CACHE_TTL_SECONDS)
+
+register("questions", """Suggest 3 research questions on: '{topic}'
+        Format as markdown bullet points""",
+         max_output_tokens=512)
+
+register("literature", """Write a detailed literature review (400-500 words) on: "{topic}".
+        Include 5 relevant papers with summaries, overall findings, and research gaps.
+        Use markdown formatting with headings and bullet points.""",
+         max_output_tokens=2048)
+
+register("future", """List 5 future research directions for: '{topic}'
+        Format as markdown bullet points""",
+         max_output_tokens=512)
+
+register("references", """Provide 5 APA-style references for papers related to: '{topic}'
+        Format as numbered list""",
+         max_output_tokens=1024)
+
+register("abstract", """Write a formal academic abstract (150-200 words) for: '{topic}'
+        Use professional academic language""",
+         max_output_tokens=768)
+
+register("analysis", """Generate exactly 5 sub-topics related to: '{topic}', each a one-sentence description.""",
+         output_format="json", schema=parsing.SUBTOPICS_SCHEMA, max_output_tokens=512)
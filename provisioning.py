@@ -0,0 +1,97 @@
+"""Bulk user import from CSV or JSON files"""
+import csv
+import io
+import json
+import sqlite3
+
+from passwords import hash_passwords
+
+ROLES = ("user", "admin")
+MAX_USERNAME_LENGTH = 64
+
+
+def parse_user_file(filename, data):
+    """Read users from CSV (username,password[,role] header) or a JSON list of objects.
+
+    Returns (row_number, username, password, role) tuples; role defaults to 'user'.
+    """
+    text = data.decode("utf-8-sig") if isinstance(data, bytes) else data
+    if filename.lower().endswith(".json"):
+        records = json.loads(text)
+        if not isinstance(records, list):
+            raise ValueError("JSON file must contain a list of user objects")
+    else:
+        records = list(csv.DictReader(io.StringIO(text)))
+    users = []
+    for row_number, record in enumerate(records, start=1):
+        if not isinstance(record, dict):
+            raise ValueError(f"Row {row_number} is not an object")
+        users.append((
+            row_number,
+            str(record.get("username") or "").strip(),
+            str(record.get("password") or ""),
+            str(record.get("role") or "user").strip().lower()
+        ))
+    return users
+
+
+def _existing_usernames(c, usernames):
+    existing = set()
+    usernames = list(usernames)
+    for start in range(0, len(usernames), 500):
+        chunk = usernames[start:start + 500]
+        c.execute(f"SELECT username FROM users WHERE username IN ({','.join('?' * len(chunk))})", chunk)
+        existing.update(row[0] for row in c.fetchall())
+    return existing
+
+
+def validate_users(c, users):
+    """Split parsed users into valid ones and (row_number, username, error) tuples"""
+    valid, errors, seen = [], [], set()
+    existing = _existing_usernames(c, {user[1] for user in users if user[1]})
+    for row_number, username, password, role in users:
+        if not username or not password:
+            errors.append((row_number, username, "Username and password are required"))
+        elif len(username) > MAX_USERNAME_LENGTH:
+            errors.append((row_number, username, f"Username longer than {MAX_USERNAME_LENGTH} characters"))
+        elif role not in ROLES:
+            errors.append((row_number, username, f"Unknown role '{role}'"))
+        elif username in seen:
+            errors.append((row_number, username, "Duplicate username in file"))
+        elif username in existing:
+            errors.append((row_number, username, "Username already exists"))
+        else:
+            seen.add(username)
+            valid.append((row_number, username, password, role))
+    return valid, errors
+
+
+def provision_users(db_name, users, progress=None):
+    """Create users in bulk: validate, hash in parallel, insert in one transaction.
+
+    `progress(done, total)` reports hashing progress. Returns (created, errors).
+    """
+    conn = sqlite3.connect(db_name, timeout=30)
+    try:
+        # Reject bad rows before spending CPU on hashing them
+        valid, errors = validate_users(conn.cursor(), users)
+        if not valid:
+            return 0, errors
+        hashes = hash_passwords([user[2] for user in valid], progress)
+
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        # Re-check under the write lock in case someone signed up meanwhile
+        taken = _existing_usernames(c, [user[1] for user in valid])
+        rows = []
+        for (row_number, username, _, role), password_hash in zip(valid, hashes):
+            if username in taken:
+                errors.append((row_number, username, "Username already exists"))
+            else:
+                rows.append((username, password_hash, role))
+        c.executemany("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)", rows)
+        conn.commit()
+        errors.sort()
+        return len(rows), errors
+    finally:
+        conn.close()
@@ -0,0 +1,211 @@
+"""Per-user daily and monthly quotas on Gemini requests and tokens.
+
+Usage is counted in memory and checked there before every model call, so the
+check costs no database round-trip. A daemon thread adds the pending counts to
+the usage_counters table every QUOTA_FLUSH_SECONDS and reads the totals back,
+which also picks up what other processes (the API server, the batch CLI) have
+used. Limits are set per role and period; the defaults below apply until an
+admin saves other values, which are kept in the role_quotas table and re-read
+on every flush, as are users' roles. A limit of 0 means unlimited.
+
+The installed Gemini SDK does not report token usage, so tokens are estimated
+from the prompt and response length. Calls running concurrently can overshoot
+a limit by at most the calls already in flight.
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+PERIODS = ("day", "month")
+ROLES = ("user", "admin")
+QUOTA_FLUSH_SECONDS = float(os.getenv("QUOTA_FLUSH_SECONDS", "10"))
+CHARS_PER_TOKEN = 4
+# (role, period) -> (max requests, max tokens)
+DEFAULT_QUOTAS = {
+    ("user", "day"): (int(os.getenv("QUOTA_USER_DAILY_REQUESTS", "200")),
+                      int(os.getenv("QUOTA_USER_DAILY_TOKENS", "300000"))),
+    ("user", "month"): (int(os.getenv("QUOTA_USER_MONTHLY_REQUESTS", "3000")),
+                        int(os.getenv("QUOTA_USER_MONTHLY_TOKENS", "4000000"))),
+    ("admin", "day"): (0, 0),
+    ("admin", "month"): (0, 0)
+}
+
+
+class QuotaExceeded(Exception):
+    """The user has used up a request or token quota"""
+
+
+def estimate_tokens(text):
+    return -(-len(text or "") // CHARS_PER_TOKEN)
+
+
+def period_key(period, now=None):
+    """The counter row for the current UTC day or month, e.g. "day:2024-05-01" or "month:2024-05" """
+    fmt = "%Y-%m-%d" if period == "day" else "%Y-%m"
+    return f"{period}:{time.strftime(fmt, time.gmtime(now))}"
+
+
+def _read_limits(conn):
+    limits = dict(DEFAULT_QUOTAS)
+    for role, period, max_requests, max_tokens in conn.execute(
+            "SELECT role, period, max_requests, max_tokens FROM role_quotas"):
+        limits[(role, period)] = (max_requests, max_tokens)
+    return limits
+
+
+class QuotaTracker:
+    """In-memory usage counters with write-behind to SQLite, shared by all sessions of a process"""
+
+    def __init__(self, db_name, flush_interval=QUOTA_FLUSH_SECONDS, start=True):
+        self.db_name = db_name
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._used = {}     # (user_id, period key) -> [requests, tokens], including pending
+        self._pending = {}  # (user_id, period key) -> [requests, tokens] not yet in the database
+        self._roles = {}    # user_id -> role
+        self._limits = dict(DEFAULT_QUOTAS)
+        self._load()
+        if start:
+            threading.Thread(target=self._run, name="quota-flusher", daemon=True).start()
+            atexit.register(self.flush)
+
+    def _load(self):
+        current = [period_key(period) for period in PERIODS]
+        conn = sqlite3.connect(self.db_name)
+        try:
+            limits = _read_limits(conn)
+            rows = conn.execute("SELECT user_id, period, requests, tokens FROM usage_counters "
+                                "WHERE period IN (?, ?)", current).fetchall()
+        finally:
+            conn.close()
+        self._limits = limits
+        for user_id, period, requests, tokens in rows:
+            self._used[(user_id, period)] = [requests, tokens]
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass  # counts stay pending and go out with the next flush
+
+    def _role(self, user_id):
+        role = self._roles.get(user_id)
+        if role is None:
+            conn = sqlite3.connect(self.db_name)
+            try:
+                row = conn.execute("SELECT role FROM users WHERE id = ?", (user_id,)).fetchone()
+            finally:
+                conn.close()
+            role = self._roles[user_id] = row[0] if row else "user"
+        return role
+
+    def limits(self, role):
+        """{period: (max requests, max tokens)} for a role"""
+        with self._lock:
+            return {period: self._limits.get((role, period), (0, 0)) for period in PERIODS}
+
+    def check(self, user_id):
+        """Raise QuotaExceeded if the user has no requests or tokens left in any period"""
+        if user_id is None:
+            return
+        role = self._role(user_id)
+        with self._lock:
+            for period in PERIODS:
+                max_requests, max_tokens = self._limits.get((role, period), (0, 0))
+                requests, tokens = self._used.get((user_id, period_key(period)), (0, 0))
+                if max_requests and requests >= max_requests:
+                    raise QuotaExceeded(f"You have used all {max_requests} generations allowed per {period}")
+                if max_tokens and tokens >= max_tokens:
+                    raise QuotaExceeded(f"You have used all {max_tokens:,} tokens allowed per {period}")
+
+    def record(self, user_id, tokens):
+        """Count one model call and its tokens against the user's current periods"""
+        if user_id is None:
+            return
+        with self._lock:
+            for period in PERIODS:
+                key = (user_id, period_key(period))
+                for counts in (self._used.setdefault(key, [0, 0]), self._pending.setdefault(key, [0, 0])):
+                    counts[0] += 1
+                    counts[1] += tokens
+
+    def flush(self):
+        """Add pending counts to the database and refresh the in-memory totals, limits and roles from it"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            current = [period_key(period) for period in PERIODS]
+            conn = sqlite3.connect(self.db_name)
+            try:
+                conn.executemany("""
+                    INSERT INTO usage_counters (user_id, period, requests, tokens) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(user_id, period) DO UPDATE SET requests = requests + excluded.requests,
+                        tokens = tokens + excluded.tokens
+                """, [(user_id, period, counts[0], counts[1]) for (user_id, period), counts in pending.items()])
+                conn.commit()
+                rows = conn.execute("SELECT user_id, period, requests, tokens FROM usage_counters "
+                                    "WHERE period IN (?, ?)", current).fetchall()
+                # Limits another process saved
+                limits = _read_limits(conn)
+            except sqlite3.Error:
+                with self._lock:
+                    for key, counts in pending.items():
+                        merged = self._pending.setdefault(key, [0, 0])
+                        merged[0] += counts[0]
+                        merged[1] += counts[1]
+                raise
+            finally:
+                conn.close()
+            with self._lock:
+                # Database totals plus whatever was counted while this flush ran; old periods drop out
+                used = {(user_id, period): [requests, tokens] for user_id, period, requests, tokens in rows}
+                for key, counts in self._pending.items():
+                    totals = used.setdefault(key, [0, 0])
+                    totals[0] += counts[0]
+                    totals[1] += counts[1]
+                self._used = used
+                self._limits = limits
+                # Roles are looked up again, so promotions and demotions apply from the next flush
+                self._roles = {}
+
+    def set_limits(self, role, period, max_requests, max_tokens):
+        """Change a role's quota for a period (0 = unlimited).
+
+        Takes effect at once in this process and on their next flush in the others.
+        """
+        # Held so a flush running now can't put back the limits it read before this write
+        with self._flush_lock:
+            conn = sqlite3.connect(self.db_name)
+            try:
+                conn.execute("""
+                    INSERT INTO role_quotas (role, period, max_requests, max_tokens) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(role, period) DO UPDATE SET max_requests = excluded.max_requests,
+                        max_tokens = excluded.max_tokens
+                """, (role, period, max_requests, max_tokens))
+                conn.commit()
+            finally:
+                conn.close()
+            with self._lock:
+                self._limits[(role, period)] = (max_requests, max_tokens)
+
+    def usage(self, period):
+        """(user_id, username, role, requests, tokens) for the current period, heaviest first"""
+        with self._lock:
+            used = {user_id: counts for (user_id, key), counts in self._used.items() if key == period_key(period)}
+        if not used:
+            return []
+        conn = sqlite3.connect(self.db_name)
+        try:
+            placeholders = ",".join("?" * len(used))
+            users = {row[0]: row[1:] for row in conn.execute(
+                f"SELECT id, username, role FROM users WHERE id IN ({placeholders})", list(used))}
+        finally:
+            conn.close()
+        rows = [(user_id,) + users.get(user_id, ("(deleted)", "user")) + tuple(counts)
+                for user_id, counts in used.items()]
+        return sorted(rows, key=lambda row: (-row[4], -row[3], row[1]))
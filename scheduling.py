@@ -0,0 +1,144 @@
+"""Fair scheduling of Gemini calls across users.
+
+Every model call takes a slot from a FairScheduler first. At most
+MAX_CONCURRENT calls run at once and at most MAX_PER_USER per user. Waiting
+calls are served by priority class (INTERACTIVE, then PREFETCH, then BATCH)
+and, within a class, by start-time fair queuing: each call is tagged with a
+virtual start time that advances by cost / weight for its user, so a user who
+keeps the queue busy falls behind users who have asked for less, and a user
+with weight 2 gets twice the share of one with weight 1. Cost is the prompt's
+output token budget, so a long review counts for more than a list of questions.
+
+The scheduler only orders and bounds calls made in this process; the Gemini
+rate limit itself stays with engine.RateLimiter.
+"""
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from itertools import count
+
+INTERACTIVE = 0
+PREFETCH = 1
+BATCH = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", PREFETCH: "prefetch", BATCH: "batch"}
+
+MAX_CONCURRENT = int(os.getenv("SCHEDULER_MAX_CONCURRENT", "8"))
+MAX_PER_USER = int(os.getenv("SCHEDULER_MAX_PER_USER", "2"))
+WAIT_SECONDS = float(os.getenv("SCHEDULER_WAIT_SECONDS", "30"))
+ROLE_WEIGHTS = {"user": 1.0, "admin": float(os.getenv("SCHEDULER_ADMIN_WEIGHT", "2"))}
+
+
+class QueueTimeout(Exception):
+    """No slot was granted within the wait time"""
+
+
+def role_weight(role):
+    return ROLE_WEIGHTS.get(role, 1.0)
+
+
+class _Ticket:
+    __slots__ = ("user", "priority", "start", "finish", "seq", "enqueued", "granted")
+
+    def __init__(self, user, priority, start, finish, seq):
+        self.user = user
+        self.priority = priority
+        self.start = start
+        self.finish = finish
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.granted = False
+
+
+class FairScheduler:
+    def __init__(self, max_concurrent=MAX_CONCURRENT, per_user_limit=MAX_PER_USER):
+        self.max_concurrent = max_concurrent
+        self.per_user_limit = per_user_limit
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._running = Counter()
+        self._finish = {}  # user -> virtual finish time of their latest call
+        self._virtual_time = 0.0
+        self._seq = count()
+        self._served = Counter()
+        self._timeouts = Counter()
+        self._wait_total = Counter()
+        self._wait_max = Counter()
+
+    @contextmanager
+    def slot(self, user=None, priority=INTERACTIVE, cost=1.0, weight=1.0, timeout=WAIT_SECONDS):
+        """Hold one call slot for the body; raises QueueTimeout if none is granted within `timeout`"""
+        ticket = self._acquire(user, priority, cost, weight, timeout)
+        try:
+            yield
+        finally:
+            self._release(ticket)
+
+    def _acquire(self, user, priority, cost, weight, timeout):
+        with self._cond:
+            start = max(self._virtual_time, self._finish.get(user, 0.0))
+            ticket = _Ticket(user, priority, start, start + cost / max(weight, 0.01), next(self._seq))
+            self._finish[user] = ticket.finish
+            self._waiting.append(ticket)
+            self._dispatch()
+            if not self._cond.wait_for(lambda: ticket.granted, timeout):
+                self._waiting.remove(ticket)
+                # Give back the virtual time this call would have used
+                if self._finish.get(user) == ticket.finish:
+                    self._finish[user] = ticket.start
+                self._timeouts[priority] += 1
+                raise QueueTimeout("All generation slots are busy, try again shortly")
+            waited = time.monotonic() - ticket.enqueued
+            self._served[priority] += 1
+            self._wait_total[priority] += waited
+            self._wait_max[priority] = max(self._wait_max[priority], waited)
+            return ticket
+
+    def _release(self, ticket):
+        with self._cond:
+            self._running[ticket.user] -= 1
+            if not self._running[ticket.user]:
+                del self._running[ticket.user]
+                if (self._finish.get(ticket.user, 0.0) <= self._virtual_time
+                        and not any(t.user == ticket.user for t in self._waiting)):
+                    self._finish.pop(ticket.user, None)
+            self._dispatch()
+
+    def _dispatch(self):
+        """Grant slots to waiting tickets in (priority, virtual start, arrival) order; caller holds the lock"""
+        granted = False
+        while sum(self._running.values()) < self.max_concurrent:
+            eligible = [t for t in self._waiting if self._running[t.user] < self.per_user_limit]
+            if not eligible:
+                break
+            ticket = min(eligible, key=lambda t: (t.priority, t.start, t.seq))
+            self._waiting.remove(ticket)
+            self._running[ticket.user] += 1
+            self._virtual_time = max(self._virtual_time, ticket.start)
+            ticket.granted = granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def stats(self):
+        """Queue metrics: per priority class, and per user with calls running or waiting"""
+        with self._cond:
+            now = time.monotonic()
+            classes = []
+            for priority, name in PRIORITY_NAMES.items():
+                waiting = [t for t in self._waiting if t.priority == priority]
+                served = self._served[priority]
+                classes.append({
+                    "class": name,
+                    "waiting": len(waiting),
+                    "oldest_wait": round(max((now - t.enqueued for t in waiting), default=0.0), 2),
+                    "served": served,
+                    "timeouts": self._timeouts[priority],
+                    "avg_wait": round(self._wait_total[priority] / served, 3) if served else 0.0,
+                    "max_wait": round(self._wait_max[priority], 3)
+                })
+            users = Counter(t.user for t in self._waiting)
+            per_user = [{"user": user, "running": self._running[user], "waiting": users[user]}
+                        for user in set(users) | set(self._running)]
+            return {"running": sum(self._running.values()), "max_concurrent": self.max_concurrent,
+                    "per_user_limit": self.per_user_limit, "classes": classes, "users": per_user}
@@ -0,0 +1,213 @@
+"""Deterministic synthetic dataset generator for scale benchmarks.
+
+Builds a database with thousands of users and millions of research_history rows:
+Zipf-skewed topic popularity and per-user activity, content sizes drawn per
+content type, and popular content shared through the blob store. Secondary
+indexes and triggers are dropped during the bulk load and rebuilt once at the
+end, also when the load fails. The same --seed always produces the same data;
+running it again on a seeded database adds more users after the existing ones.
+
+Usage:
+    python seed_data.py --db scholarmind_bench.db --users 5000 --history 1000000 --seed 42
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import time
+
+from database import (DatabaseManager, HAS_FTS5, compress_content, content_hash, ensure_schema,
+                      rebuild_search_index, rebuild_usage_rollups)
+from passwords import hash_password
+
+SEED_PASSWORD = "password"
+# Median content length (chars) per content type; actual sizes are log-normal around it
+CONTENT_SIZES = {
+    "questions": 450,
+    "literature": 3500,
+    "future": 750,
+    "references": 900,
+    "abstract": 1300,
+    "analysis": 420
+}
+CONTENT_TYPE_WEIGHTS = [20, 15, 15, 12, 18, 20]
+# Each (topic, content_type) pair has this many shared variants that popular generations reuse
+SHARED_VARIANTS = 3
+DEFERRED_INDEXES = [
+    "idx_research_history_user_created",
+    "idx_research_history_content_hash",
+    "idx_users_created",
+    "idx_users_role_created"
+]
+DEFERRED_TRIGGERS = ["research_history_usage_rollup"]
+SUBJECTS = ("Machine Learning", "Quantum Computing", "Climate Modeling", "Genomics", "Renewable Energy",
+            "Neuroscience", "Blockchain", "Robotics", "Public Health", "Materials Science", "Linguistics",
+            "Cybersecurity", "Astrophysics", "Education Technology", "Urban Planning", "Microbiology")
+ASPECTS = ("Ethics of", "Advances in", "Scalable", "Interpretable", "Low-Resource", "Federated", "Sustainable",
+           "Real-Time", "Privacy-Preserving", "Explainable", "Robust", "Efficient")
+VOCABULARY = ("the model data learning network analysis method results study framework approach system "
+              "performance evaluation research novel significant propose demonstrate dataset baseline "
+              "accuracy robust efficient scalable limitation future direction literature review gap "
+              "experiment hypothesis theory empirical quantitative qualitative sample participants "
+              "algorithm optimization training inference benchmark survey findings implications").split()
+
+
+def _zipf_cum_weights(n, exponent):
+    total, cum = 0.0, []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** exponent
+        cum.append(total)
+    return cum
+
+
+def _topics(rng, count):
+    topics = [f"{aspect} {subject}" for subject in SUBJECTS for aspect in ASPECTS]
+    rng.shuffle(topics)
+    while len(topics) < count:
+        topics.append(f"{rng.choice(ASPECTS)} {rng.choice(SUBJECTS)} #{len(topics)}")
+    return topics[:count]
+
+
+def _document(rng, topic, content_type):
+    target = int(rng.lognormvariate(0, 0.35) * CONTENT_SIZES[content_type])
+    parts = [f"# {topic}: {content_type.title()}\n"]
+    length = len(parts[0])
+    while length < target:
+        sentence = " ".join(rng.choices(VOCABULARY, k=rng.randint(8, 20))).capitalize() + "."
+        prefix = "\n* " if rng.random() < 0.2 else " "
+        parts.append(prefix + sentence)
+        length += len(sentence) + len(prefix)
+    return "".join(parts)
+
+
+def _set_deferred(c, enabled):
+    if enabled:
+        ensure_schema(c)
+        return
+    for name in DEFERRED_INDEXES:
+        c.execute(f"DROP INDEX IF EXISTS {name}")
+    for name in DEFERRED_TRIGGERS:
+        c.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def _next_seed_number(c):
+    # Seeded usernames continue after the highest one already present
+    c.execute("SELECT MAX(CAST(substr(username, 11) AS INTEGER)) FROM users "
+              "WHERE username GLOB 'seed_user_[0-9]*'")
+    return (c.fetchone()[0] or -1) + 1
+
+
+def seed(db_name, users, history, seed_value, topic_count, skew, unique_ratio, days, end, batch_size,
+         search_index=True):
+    rng = random.Random(seed_value)
+    DatabaseManager(db_name)  # schema and default admin
+    conn = sqlite3.connect(db_name)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-200000")
+    c = conn.cursor()
+    _set_deferred(c, False)
+    conn.commit()
+
+    try:
+        started = time.perf_counter()
+        # One hash for every seeded account keeps user creation from being CPU bound
+        password_hash = hash_password(SEED_PASSWORD)
+        c.execute("SELECT COALESCE(MAX(id), 0) FROM users")
+        first_user = c.fetchone()[0] + 1
+        first_number = _next_seed_number(c)
+        c.executemany("INSERT INTO users (username, password_hash, role, created_at) VALUES (?, ?, ?, ?)",
+                      [(f"seed_user_{first_number + i:07d}", password_hash,
+                        "admin" if rng.random() < 0.01 else "user",
+                        (end - datetime.timedelta(days=days * rng.random())).strftime("%Y-%m-%d %H:%M:%S"))
+                       for i in range(users)])
+        conn.commit()
+        print(f"Inserted {users} users in {time.perf_counter() - started:.1f}s", flush=True)
+
+        topics = _topics(rng, topic_count)
+        topic_weights = _zipf_cum_weights(len(topics), skew)
+        user_weights = _zipf_cum_weights(users, 0.8)
+        content_types = list(CONTENT_SIZES)
+        known_hashes = set()
+        start_time = end - datetime.timedelta(days=days)
+        step = datetime.timedelta(days=days) / max(history, 1)
+
+        started = time.perf_counter()
+        done = 0
+        while done < history:
+            count = min(batch_size, history - done)
+            picked_topics = rng.choices(topics, cum_weights=topic_weights, k=count)
+            picked_users = rng.choices(range(first_user, first_user + users), cum_weights=user_weights, k=count)
+            picked_types = rng.choices(content_types, weights=CONTENT_TYPE_WEIGHTS, k=count)
+            blobs, rows = [], []
+            for i in range(count):
+                topic, content_type = picked_topics[i], picked_types[i]
+                if rng.random() < unique_ratio:
+                    content = _document(rng, topic, content_type)
+                else:
+                    # Shared variants come from their own RNG so they are identical wherever they appear
+                    variant = rng.randrange(SHARED_VARIANTS)
+                    content = _document(random.Random(f"{seed_value}:{topic}:{content_type}:{variant}"),
+                                        topic, content_type)
+                digest = content_hash(content)
+                if digest not in known_hashes:
+                    known_hashes.add(digest)
+                    blobs.append((digest, compress_content(content), len(content)))
+                created_at = start_time + step * (done + i) + datetime.timedelta(seconds=rng.random() * 60)
+                rows.append((picked_users[i], topic, content_type, "", digest,
+                             created_at.strftime("%Y-%m-%d %H:%M:%S")))
+            # Blobs from an earlier run are already there; ref counts are recomputed at the end
+            c.executemany("INSERT OR IGNORE INTO content_blobs (hash, content, size, ref_count) VALUES (?, ?, ?, 0)",
+                          blobs)
+            c.executemany("INSERT INTO research_history (user_id, topic, content_type, content, content_hash, "
+                          "created_at) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.commit()
+            done += count
+            rate = done / (time.perf_counter() - started)
+            print(f"  {done}/{history} history rows ({rate:,.0f} rows/s, {len(known_hashes)} blobs)", flush=True)
+    finally:
+        # Restore what the load dropped even if it stopped early, so the database stays usable
+        started = time.perf_counter()
+        _set_deferred(c, True)
+        c.execute("""
+            UPDATE content_blobs SET ref_count =
+                (SELECT COUNT(*) FROM research_history WHERE content_hash = content_blobs.hash)
+        """)
+        rebuild_usage_rollups(c)
+        if search_index and HAS_FTS5:
+            rebuild_search_index(c)
+        conn.commit()
+    c.execute("ANALYZE")
+    conn.close()
+    print(f"Rebuilt indexes, rollups{' and search index' if search_index else ''} "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a reproducible large ScholarMind dataset")
+    parser.add_argument("--db", default="scholarmind_bench.db", help="Database to create or extend")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--history", type=int, default=1_000_000, help="research_history rows")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--topics", type=int, default=2000, help="Distinct topics")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of topic popularity")
+    parser.add_argument("--unique-ratio", type=float, default=0.3,
+                        help="Share of rows with unique content; the rest reuse popular variants")
+    parser.add_argument("--days", type=int, default=730, help="Days of history to spread rows over")
+    parser.add_argument("--end", default="2026-01-01",
+                        help="Date of the newest row (YYYY-MM-DD, or 'today' at the cost of reproducibility)")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--no-search-index", action="store_true", help="Skip building the FTS index")
+    parser.add_argument("--overwrite", action="store_true", help="Delete the database first")
+    args = parser.parse_args()
+
+    if args.overwrite and os.path.exists(args.db):
+        os.remove(args.db)
+    end = datetime.datetime.now() if args.end == "today" else datetime.datetime.strptime(args.end, "%Y-%m-%d")
+    seed(args.db, args.users, args.history, args.seed, args.topics, args.skew, args.unique_ratio, args.days,
+         end, args.batch_size, search_index=not args.no_search_index)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Server-side login sessions behind signed, expiring tokens.
+
+A token is "<session id>.<expiry>.<signature>", signed with HMAC-SHA256 using a
+secret kept in the settings table. Forged or expired tokens are rejected without
+touching the database; valid ones are looked up in the sessions table, so a
+session can be revoked at any time. Each session also keeps a JSON blob of the
+UI state to restore after a browser reload, with no password verify.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import time
+
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+SECRET_KEY = "session_secret"
+
+_secrets = {}
+
+
+def _secret(db_name):
+    # Created once per database and shared by every server process using it
+    if db_name not in _secrets:
+        conn = sqlite3.connect(db_name)
+        try:
+            conn.execute("INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)",
+                         (SECRET_KEY, secrets.token_hex(32)))
+            conn.commit()
+            _secrets[db_name] = conn.execute("SELECT value FROM settings WHERE key = ?",
+                                             (SECRET_KEY,)).fetchone()[0].encode()
+        finally:
+            conn.close()
+    return _secrets[db_name]
+
+
+def _sign(db_name, payload):
+    digest = hmac.new(_secret(db_name), payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def _parse_token(db_name, token):
+    """Session id of a well-formed, correctly signed, unexpired token, else None"""
+    parts = (token or "").split(".")
+    if len(parts) != 3 or not parts[1].isdigit():
+        return None
+    session_id, expires, signature = parts
+    if not hmac.compare_digest(signature, _sign(db_name, f"{session_id}.{expires}")):
+        return None
+    if int(expires) < time.time():
+        return None
+    return session_id
+
+
+def create_session(db_name, user_id, state=None, ttl=SESSION_TTL_SECONDS):
+    """Start a session for a user and return its token"""
+    session_id = secrets.token_urlsafe(18)
+    now = time.time()
+    expires = int(now + ttl)
+    conn = sqlite3.connect(db_name)
+    try:
+        conn.execute("INSERT INTO sessions (id, user_id, created_at, expires_at, last_seen, state) "
+                     "VALUES (?, ?, ?, ?, ?, ?)",
+                     (session_id, user_id, now, expires, now, json.dumps(state or {})))
+        conn.commit()
+    finally:
+        conn.close()
+    return f"{session_id}.{expires}.{_sign(db_name, f'{session_id}.{expires}')}"
+
+
+def resolve_session(db_name, token):
+    """The user and saved state behind a token, or None if it is invalid, expired or revoked.
+
+    Role and username come from the users table, so changes apply on the next reload.
+    """
+    session_id = _parse_token(db_name, token)
+    if session_id is None:
+        return None
+    conn = sqlite3.connect(db_name)
+    try:
+        row = conn.execute("""
+            SELECT s.user_id, u.username, u.role, s.state
+            FROM sessions s JOIN users u ON u.id = s.user_id
+            WHERE s.id = ? AND s.revoked = 0 AND s.expires_at > ?
+        """, (session_id, time.time())).fetchone()
+        if row:
+            conn.execute("UPDATE sessions SET last_seen = ? WHERE id = ?", (time.time(), session_id))
+            conn.commit()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    return {
+        'id': row[0],
+        'username': row[1],
+        'role': row[2],
+        'is_admin': row[2] == 'admin',
+        'state': json.loads(row[3] or "{}")
+    }
+
+
+def session_active(db_name, token):
+    """Whether a token still refers to a live session (cheap enough to check on every rerun)"""
+    session_id = _parse_token(db_name, token)
+    if session_id is None:
+        return False
+    conn = sqlite3.connect(db_name)
+    try:
+        return conn.execute("SELECT 1 FROM sessions WHERE id = ? AND revoked = 0 AND expires_at > ?",
+                            (session_id, time.time())).fetchone() is not None
+    finally:
+        conn.close()
+
+
+def save_session_state(db_name, token, state):
+    """Store the UI state to restore when the session reconnects"""
+    session_id = _parse_token(db_name, token)
+    if session_id is None:
+        return
+    conn = sqlite3.connect(db_name)
+    try:
+        conn.execute("UPDATE sessions SET state = ?, last_seen = ? WHERE id = ? AND revoked = 0",
+                     (json.dumps(state), time.time(), session_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def revoke_session(db_name, token=None, session_id=None):
+    """Revoke one session, by token (logout) or by id (admin panel)"""
+    session_id = session_id or (token or "").split(".")[0]
+    conn = sqlite3.connect(db_name)
+    try:
+        conn.execute("UPDATE sessions SET revoked = 1 WHERE id = ?", (session_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def revoke_user_sessions(db_name, user_id):
+    """Revoke every session of a user; returns how many were active"""
+    conn = sqlite3.connect(db_name)
+    try:
+        cursor = conn.execute("UPDATE sessions SET revoked = 1 WHERE user_id = ? AND revoked = 0", (user_id,))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def list_sessions(db_name, limit=200):
+    """Active sessions, most recently seen first: (id, user_id, username, created, last_seen, expires)"""
+    conn = sqlite3.connect(db_name)
+    try:
+        return conn.execute("""
+            SELECT s.id, s.user_id, u.username, s.created_at, s.last_seen, s.expires_at
+            FROM sessions s JOIN users u ON u.id = s.user_id
+            WHERE s.revoked = 0 AND s.expires_at > ?
+            ORDER BY s.last_seen DESC
+            LIMIT ?
+        """, (time.time(), limit)).fetchall()
+    finally:
+        conn.close()
+
+
+def purge_sessions(db_name):
+    """Delete expired and revoked sessions; returns how many were removed"""
+    conn = sqlite3.connect(db_name)
+    try:
+        cursor = conn.execute("DELETE FROM sessions WHERE revoked = 1 OR expires_at <= ?", (time.time(),))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
@@ -0,0 +1,132 @@
+"""Read-only snapshot of the database for analytics, exports and admin dashboards.
+
+The snapshot is copied with the SQLite online backup API a few pages at a time,
+so live writers are only ever blocked for one short step. A write to the source
+between steps makes the copy start over, so under steady writes it gives up after
+BACKUP_MAX_RESTARTS restarts or BACKUP_MAX_SECONDS and copies everything in one
+step instead, a single read transaction. The outcome of the last refresh is kept
+in `refresh_status()`. Readers open the copy read-only and never contend with
+user writes on the main database.
+"""
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import quote
+
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "scholarmind_snapshot.db")
+# Snapshots older than this are refreshed before being read
+SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("SNAPSHOT_MAX_AGE_SECONDS", "300"))
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_SLEEP_SECONDS = 0.01
+BACKUP_MAX_RESTARTS = int(os.getenv("SNAPSHOT_BACKUP_MAX_RESTARTS", "3"))
+BACKUP_MAX_SECONDS = float(os.getenv("SNAPSHOT_BACKUP_MAX_SECONDS", "30"))
+
+# Reentrant so connect_snapshot can hold it across its age check and the refresh
+_refresh_lock = threading.RLock()
+_status = {"finished_at": None, "single_step": False, "error": None}
+
+
+class _BackupStalled(Exception):
+    """The stepped copy kept restarting or ran out of time"""
+
+
+def snapshot_age(path=SNAPSHOT_PATH):
+    """Seconds since the snapshot was taken, or None if there is none"""
+    try:
+        return max(0.0, time.time() - os.path.getmtime(path))
+    except OSError:
+        return None
+
+
+def refresh_status():
+    """{"finished_at", "single_step", "error"} for the last refresh in this process.
+
+    single_step is True when the stepped copy gave up and the whole database was
+    copied at once; error is set when the refresh failed.
+    """
+    return dict(_status)
+
+
+def _stall_check(max_restarts, max_seconds):
+    """backup() progress callback that aborts a copy that keeps restarting or takes too long"""
+    started = time.monotonic()
+    restarts = 0
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last_remaining
+        # The copy starts over when another connection writes to the source
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _BackupStalled(f"restarted {restarts} times")
+        last_remaining = remaining
+        if time.monotonic() - started > max_seconds:
+            raise _BackupStalled(f"not done after {max_seconds:.0f} s")
+
+    return progress
+
+
+def _backup(db_name, tmp_path, pages, sleep, progress=None):
+    source = sqlite3.connect(db_name, timeout=30)
+    target = sqlite3.connect(tmp_path)
+    try:
+        source.backup(target, pages=pages, progress=progress, sleep=sleep)
+    finally:
+        target.close()
+        source.close()
+
+
+def refresh_snapshot(db_name="scholarmind.db", path=SNAPSHOT_PATH, pages=BACKUP_PAGES_PER_STEP,
+                     sleep=BACKUP_SLEEP_SECONDS):
+    """Copy the database into a new snapshot and atomically swap it in"""
+    tmp_path = f"{path}.tmp"
+    with _refresh_lock:
+        single_step = False
+        try:
+            try:
+                _backup(db_name, tmp_path, pages, sleep, _stall_check(BACKUP_MAX_RESTARTS, BACKUP_MAX_SECONDS))
+            except _BackupStalled:
+                single_step = True
+                _backup(db_name, tmp_path, -1, 0)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            _status.update(finished_at=time.time(), single_step=single_step, error=str(e))
+            raise
+        _status.update(finished_at=time.time(), single_step=single_step, error=None)
+
+
+def invalidate_snapshot(path=SNAPSHOT_PATH):
+    """Mark the snapshot stale so the next read refreshes it"""
+    if os.path.exists(path):
+        os.utime(path, (0, 0))
+
+
+def connect_snapshot(db_name="scholarmind.db", path=SNAPSHOT_PATH, max_age=SNAPSHOT_MAX_AGE_SECONDS):
+    """Open the snapshot read-only, refreshing it first if it is missing or stale"""
+    age = snapshot_age(path)
+    if age is None or age > max_age:
+        with _refresh_lock:
+            # Readers that waited here while another one refreshed use its copy
+            age = snapshot_age(path)
+            if age is None or age > max_age:
+                refresh_snapshot(db_name, path)
+    return sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True)
+
+
+def start_snapshot_refresher(db_name="scholarmind.db", path=SNAPSHOT_PATH, max_age=SNAPSHOT_MAX_AGE_SECONDS):
+    """Keep the snapshot fresh from a daemon thread so readers rarely wait for a refresh"""
+    def run():
+        while True:
+            age = snapshot_age(path)
+            if age is None or age > max_age / 2:
+                try:
+                    refresh_snapshot(db_name, path)
+                except sqlite3.Error:
+                    pass  # retried on the next tick; readers refresh on demand anyway
+            time.sleep(max(1.0, max_age / 4))
+
+    thread = threading.Thread(target=run, name="snapshot-refresher", daemon=True)
+    thread.start()
+    return thread
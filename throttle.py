@@ -0,0 +1,175 @@
+"""Login throttling against credential stuffing.
+
+Failed logins are counted in a sliding window per key (a username or a client),
+in memory for speed and written through to the login_attempts table so limits
+survive a restart. A key that reaches its limit is locked out for a period that
+doubles on every further lockout, and locked keys are rejected before any
+password hashing happens.
+
+Every failure is a read-modify-write of the key's row in one transaction, so
+processes sharing the database add up their counts; a process sees a lockout
+set by another one the next time it records a failure for that key.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+THROTTLE_WINDOW_SECONDS = int(os.getenv("THROTTLE_WINDOW_SECONDS", "900"))
+# Failures allowed within the window before a lockout, per username and per client
+USER_MAX_FAILURES = int(os.getenv("USER_MAX_FAILURES", "5"))
+CLIENT_MAX_FAILURES = int(os.getenv("CLIENT_MAX_FAILURES", "20"))
+LOCKOUT_BASE_SECONDS = int(os.getenv("LOCKOUT_BASE_SECONDS", "30"))
+LOCKOUT_MAX_SECONDS = int(os.getenv("LOCKOUT_MAX_SECONDS", "3600"))
+# Reverse proxies in front of the server that append to X-Forwarded-For; 0 trusts no forwarded header
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+
+def user_key(username):
+    return f"user:{username.strip().lower()}"
+
+
+def client_key(client):
+    return f"client:{client}"
+
+
+def client_address(peer, forwarded_for=None, trusted_hops=None):
+    """The address to throttle a client by.
+
+    The left part of X-Forwarded-For is whatever the client sent, so it is only
+    read behind `trusted_hops` proxies, and then only the right-most entry that
+    no trusted proxy added. Without trusted proxies this is the peer address.
+    """
+    trusted_hops = TRUSTED_PROXY_HOPS if trusted_hops is None else trusted_hops
+    if trusted_hops <= 0 or not forwarded_for:
+        return peer
+    # The nearest proxy is the peer itself; each proxy before it appended one entry
+    chain = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()] + [peer]
+    return chain[max(0, len(chain) - 1 - trusted_hops)]
+
+
+def _limit(key):
+    return USER_MAX_FAILURES if key.startswith("user:") else CLIENT_MAX_FAILURES
+
+
+class LoginThrottle:
+    """Sliding-window failure counters with exponential lockout, shared by all sessions of a process"""
+
+    def __init__(self, db_name, window=THROTTLE_WINDOW_SECONDS):
+        self.db_name = db_name
+        self.window = window
+        self._lock = threading.Lock()
+        # key -> {"failures": [timestamps], "strikes": lockouts so far, "locked_until": epoch}
+        self._entries = {}
+        self._load()
+
+    def _load(self):
+        now = time.time()
+        conn = sqlite3.connect(self.db_name)
+        try:
+            rows = conn.execute("SELECT key, failures, strikes, locked_until FROM login_attempts "
+                                "WHERE updated_at > ? OR locked_until > ?",
+                                (now - max(self.window, LOCKOUT_MAX_SECONDS), now)).fetchall()
+        finally:
+            conn.close()
+        for key, failures, strikes, locked_until in rows:
+            self._entries[key] = {"failures": json.loads(failures), "strikes": strikes,
+                                  "locked_until": locked_until}
+
+    def _delete(self, keys):
+        conn = sqlite3.connect(self.db_name)
+        try:
+            conn.executemany("DELETE FROM login_attempts WHERE key = ?", [(key,) for key in keys])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _record(self, keys, now):
+        """Add a failure to each key in one transaction; returns ({key: entry} as stored, lockout seconds).
+
+        Each key's row is read back inside the transaction, so failures counted by
+        other processes sharing the database (the API server, another worker) are
+        kept rather than overwritten. Stale rows are deleted in the same transaction.
+        """
+        conn = sqlite3.connect(self.db_name, isolation_level=None)
+        entries = {}
+        lockout = 0
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for key in keys:
+                row = conn.execute("SELECT failures, strikes, locked_until FROM login_attempts WHERE key = ?",
+                                   (key,)).fetchone()
+                entry = ({"failures": json.loads(row[0]), "strikes": row[1], "locked_until": row[2]} if row
+                         else {"failures": [], "strikes": 0, "locked_until": 0.0})
+                entry["failures"] = [t for t in entry["failures"] if t > now - self.window] + [now]
+                if len(entry["failures"]) >= _limit(key):
+                    seconds = min(LOCKOUT_BASE_SECONDS * 2 ** entry["strikes"], LOCKOUT_MAX_SECONDS)
+                    entry["strikes"] += 1
+                    entry["locked_until"] = now + seconds
+                    entry["failures"] = []
+                    lockout = max(lockout, seconds)
+                conn.execute("""
+                    INSERT INTO login_attempts (key, failures, strikes, locked_until, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET failures = excluded.failures, strikes = excluded.strikes,
+                        locked_until = excluded.locked_until, updated_at = excluded.updated_at
+                """, (key, json.dumps(entry["failures"]), entry["strikes"], entry["locked_until"], now))
+                entries[key] = entry
+            # Same rule as _prune: nothing in the window and the strike history gone stale
+            conn.execute("DELETE FROM login_attempts WHERE updated_at < ? AND locked_until < ?",
+                         (now - self.window, now - LOCKOUT_MAX_SECONDS))
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return entries, lockout
+
+    def _prune(self, now):
+        # Forget keys with nothing in the window, no lock, and a strike history that has gone stale
+        for key in [key for key, entry in self._entries.items()
+                    if entry["locked_until"] <= now
+                    and not any(t > now - self.window for t in entry["failures"])
+                    and (not entry["strikes"] or entry["locked_until"] <= now - LOCKOUT_MAX_SECONDS)]:
+            del self._entries[key]
+
+    def retry_after(self, keys):
+        """Seconds until every key may try again; 0 when the attempt is allowed"""
+        now = time.time()
+        with self._lock:
+            return max([int(self._entries[key]["locked_until"] - now) + 1 for key in keys
+                        if key in self._entries and self._entries[key]["locked_until"] > now] or [0])
+
+    def record_failure(self, keys):
+        """Count a failed login; returns the lockout in seconds it triggered, if any"""
+        now = time.time()
+        with self._lock:
+            entries, lockout = self._record(keys, now)
+            self._entries.update(entries)
+            self._prune(now)
+        return lockout
+
+    def record_success(self, keys):
+        """Clear the counters of a successful login"""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+            # Delete even keys this process never saw; another process may have counted them
+            self._delete(keys)
+
+    def reset(self, key):
+        """Lift a lockout from the admin panel"""
+        self.record_success([key])
+
+    def stats(self):
+        """(key, failures in window, lockouts, seconds locked) for every tracked key, locked first"""
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            rows = [(key, sum(1 for t in entry["failures"] if t > now - self.window), entry["strikes"],
+                     max(0, int(entry["locked_until"] - now)))
+                    for key, entry in self._entries.items()]
+        return sorted(rows, key=lambda row: (-row[3], -row[1], row[0]))
@@ -0,0 +1,160 @@
+"""One-time warmup of a server process, and the readiness flag behind /healthz.
+
+Without it the first users after a deploy pay for everything cold: the schema
+check, spawning the password hashing workers, importing and configuring the
+Gemini SDK, building the CSS/JS bundle and generating the trending feed.
+`warm_up` does all of that once, in order, then primes the engine cache with the
+trending topics and the WARMUP_HOT_TOPICS sections generated most often in the
+last WARMUP_HOT_DAYS days, and only then marks the process ready.
+
+Only the database step is required; the others are best effort, so a missing
+API key or a Gemini outage delays nothing and just leaves that part cold. A host
+that has to serve right away runs just the schema and its own steps inline and
+leaves the rest to a thread (`start_warm_up(..., inline=True)`). Every
+step's outcome and timing is kept in `status()`. When the database step fails,
+the error is kept there too and the next warm_up call starts over.
+Priming is skipped when GEMINI_API_KEY is unset or WARMUP_PRIME=0.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import assets
+import engine
+import passwords
+import scheduling
+from database import ensure_schema, hot_topics
+
+WARMUP_PRIME = os.getenv("WARMUP_PRIME", "1") != "0"
+WARMUP_HOT_TOPICS = int(os.getenv("WARMUP_HOT_TOPICS", "5"))
+WARMUP_HOT_DAYS = int(os.getenv("WARMUP_HOT_DAYS", "7"))
+# Pause before start_warm_up tries again after a failed warmup
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+
+_lock = threading.Lock()
+_status = {"ready": False, "started_at": None, "finished_at": None, "error": None, "steps": []}
+
+
+def is_ready():
+    return _status["ready"]
+
+
+def status():
+    """{"ready", "started_at", "finished_at", "error", "steps": [{"name", "ok", "seconds", "detail"}]}"""
+    with _lock:
+        return dict(_status, steps=[dict(step) for step in _status["steps"]])
+
+
+def _step(name, fn, required=False):
+    started = time.perf_counter()
+    error = None
+    try:
+        detail = fn()
+        detail, ok = detail if isinstance(detail, str) else None, True
+    except Exception as e:
+        error, detail, ok = e, str(e), False
+    with _lock:
+        _status["steps"].append({"name": name, "ok": ok, "seconds": round(time.perf_counter() - started, 3),
+                                 "detail": detail})
+    if error is not None and required:
+        raise error
+
+
+def _schema(db_name):
+    conn = sqlite3.connect(db_name)
+    try:
+        ensure_schema(conn.cursor())
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _prime_hot_topics(db_name):
+    conn = sqlite3.connect(db_name)
+    try:
+        pairs = hot_topics(conn.cursor(), WARMUP_HOT_DAYS, WARMUP_HOT_TOPICS)
+    finally:
+        conn.close()
+    primed = sum(1 for topic, content_type in pairs
+                 if content_type in engine.CONTENT_TYPES
+                 and engine.generate_research_content(topic, content_type,
+                                                      priority=scheduling.PREFETCH).raw is not None)
+    return f"{primed} of {len(pairs)} sections"
+
+
+def _begin():
+    # True for the one caller that gets to run the warmup
+    with _lock:
+        if _status["started_at"] is not None:
+            return False
+        _status.update(started_at=time.time(), error=None, steps=[])
+        return True
+
+
+def _prepare(db_name, steps):
+    try:
+        _step("database schema", lambda: _schema(db_name), required=True)
+    except Exception as e:
+        with _lock:
+            # Not ready, and free for the next call to try again
+            _status.update(started_at=None, error=f"database schema: {e}")
+        raise
+    for name, fn in steps:
+        _step(name, fn)
+
+
+def _finish(db_name, prime):
+    _step("password workers", passwords.warm_pool)
+    _step("gemini client", lambda: engine.get_model() and None)
+    _step("css/js bundle", lambda: assets.injector_html() and None)
+    if prime and os.getenv("GEMINI_API_KEY"):
+        _step("trending topics",
+              lambda: f"{len(engine.get_trending_topics(priority=scheduling.PREFETCH))} topics")
+        _step("hot topics", lambda: _prime_hot_topics(db_name))
+
+    with _lock:
+        _status["finished_at"] = time.time()
+        _status["ready"] = True
+    return status()
+
+
+def warm_up(db_name="scholarmind.db", steps=(), prime=WARMUP_PRIME):
+    """Warm this process up once and mark it ready; later calls return immediately.
+
+    `steps` are extra (name, callable) pairs the host runs right after the schema,
+    e.g. the app's admin bootstrap. Returns the status.
+    """
+    if not _begin():
+        return status()
+    _prepare(db_name, steps)
+    return _finish(db_name, prime)
+
+
+def _warm_up_until_ready(db_name, steps, prime):
+    while True:
+        try:
+            return warm_up(db_name, steps, prime)
+        except Exception:
+            time.sleep(WARMUP_RETRY_SECONDS)
+
+
+def start_warm_up(db_name="scholarmind.db", steps=(), prime=WARMUP_PRIME, inline=False):
+    """Run warm_up from a daemon thread, e.g. while a server already answers /healthz.
+
+    A failed warmup is retried every WARMUP_RETRY_SECONDS; /healthz shows the error meanwhile.
+    With `inline`, the schema and `steps` run first in the calling thread, which can serve
+    requests once this returns; a schema failure is raised to it rather than retried, and
+    the rest of the warmup continues in the thread. Returns the thread, or None when the
+    warmup has already been started.
+    """
+    if inline:
+        if not _begin():
+            return None
+        _prepare(db_name, steps)
+        target, args = _finish, (db_name, prime)
+    else:
+        target, args = _warm_up_until_ready, (db_name, steps, prime)
+    thread = threading.Thread(target=target, args=args, name="warmup", daemon=True)
+    thread.start()
+    return thread